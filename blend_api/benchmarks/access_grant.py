@@ -0,0 +1,104 @@
+"""get_access_grant against a fake SDK with a large role topology.
+
+Run from blend_api/:
+
+    PYTHONPATH=.. python -m blend_api.benchmarks.access_grant
+"""
+
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from blend_api.benchmarks.timing import time_calls, time_once
+from blend_api.functions import get_access_grant as module
+from blend_api.functions.get_access_grant import get_access_grant
+from blend_api.functions.model_index import invalidate_model_group_index
+
+SDK_BASE_URL = "https://example.looker.com"
+# a large instance: a role per team, each on a handful of models
+NUMBER_OF_ROLES = 200
+NUMBER_OF_GROUPS = 5_000
+NUMBER_OF_MODELS = 60
+# simulated round trip per SDK call
+LATENCY_SECONDS = 0.002
+
+
+class FakeSdk:
+    def __init__(self, *, seed: int = 0, latency: float = LATENCY_SECONDS):
+        rng = random.Random(seed)
+        models = [f"model_{i}" for i in range(NUMBER_OF_MODELS)]
+        groups = [str(i) for i in range(NUMBER_OF_GROUPS)]
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+        # already logged in, as a pooled client is after its first request
+        self.auth = SimpleNamespace(is_authenticated=True)
+        self.roles = [
+            SimpleNamespace(
+                id=str(i),
+                model_set=SimpleNamespace(models=rng.sample(models, rng.randint(1, 8))),
+            )
+            for i in range(NUMBER_OF_ROLES)
+        ]
+        self.groups = {
+            role.id: [
+                SimpleNamespace(id=group_id, name=f"group_{group_id}")
+                for group_id in rng.sample(groups, rng.randint(5, 100))
+            ]
+            for role in self.roles
+        }
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+
+    def all_roles(self, fields=None):
+        self._call()
+        return self.roles
+
+    def role_groups(self, role_id, fields=None):
+        self._call()
+        return self.groups[role_id]
+
+
+def main(*, quick: bool = False) -> list:
+    sdk = FakeSdk()
+    original_get_sdk = module.get_sdk
+    module.get_sdk = lambda *args: sdk
+
+    def run():
+        response = get_access_grant(
+            sdk_client_id="client",
+            sdk_client_secret="secret",
+            sdk_base_url=SDK_BASE_URL,
+            user_attribute="blend_groups",
+            models={"model_0", "model_1"},
+            uuid="bench",
+        )
+        assert response["success"], response
+
+    try:
+        invalidate_model_group_index(SDK_BASE_URL)
+        cold_ms = time_once(run)
+        cold_calls = sdk.calls
+        sdk.calls = 0
+        warm = time_calls(run, repeat=20 if quick else 200)
+    finally:
+        module.get_sdk = original_get_sdk
+        invalidate_model_group_index(SDK_BASE_URL)
+    result = dict(
+        roles=NUMBER_OF_ROLES,
+        groups=NUMBER_OF_GROUPS,
+        cold_ms=cold_ms,
+        cold_sdk_calls=cold_calls,
+        warm_sdk_calls=sdk.calls,
+        **{f"warm_{key}": value for key, value in warm.items()},
+    )
+    print(result)
+    return [result]
+
+
+if __name__ == "__main__":
+    main()
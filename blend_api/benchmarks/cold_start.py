@@ -0,0 +1,57 @@
+"""Cold-start import cost of the entry point and of each lazily imported path.
+
+Every measurement runs in a fresh interpreter, as on a new function instance.
+
+Run from blend_api/:
+
+    PYTHONPATH=.. python -m blend_api.benchmarks.cold_start
+"""
+
+import os
+import subprocess
+import sys
+
+# the entry point, then what the first request on each path loads on top of it
+MODULES = {
+    "main": None,
+    "access_grant": "blend_api.functions.get_access_grant",
+    "github_commit_and_deploy": "blend_api.functions.github_commit_and_deploy",
+    "update_user_attributes": "blend_api.functions.update_user_attributes",
+}
+
+
+def import_ms(module: str | None) -> float:
+    """Time to import `module` on top of main, or main itself when None."""
+    setup = "" if module is None else "import blend_api.main"
+    measured = f"import {module or 'blend_api.main'}"
+    script = (
+        f"import time\n{setup}\nstarted_at = time.perf_counter()\n{measured}\n"
+        "print((time.perf_counter() - started_at) * 1000)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+    ).stdout
+    return float(output)
+
+
+def main(*, quick: bool = False) -> list:
+    repeat = 2 if quick else 5
+    results = []
+    for name, module in MODULES.items():
+        timings = sorted(import_ms(module) for _ in range(repeat))
+        result = dict(
+            scenario=name,
+            best_ms=round(timings[0], 1),
+            median_ms=round(timings[len(timings) // 2], 1),
+        )
+        print(result)
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""The full `main` request path against local GitHub and Looker stand-ins.
+
+Everything below the HTTP clients is real: header and body validation, the
+access grant, LookML rendering, the PyGithub contents calls and the deploy
+webhook. PyGithub's request spacing and the deploy debounce are switched off,
+since they are waits rather than work.
+
+Run from blend_api/:
+
+    PYTHONPATH=.. python -m blend_api.benchmarks.end_to_end
+"""
+
+import itertools
+from contextlib import contextmanager
+
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from blend_api import main as main_module
+from blend_api.benchmarks.request_validation import make_payload
+from blend_api.benchmarks.stand_ins import GitHubStandIn, LookerStandIn
+from blend_api.benchmarks.timing import time_calls, time_once
+from blend_api.functions import github_client
+from blend_api.functions.deploy import deploy_scheduler
+from blend_api.functions.github_commit_and_deploy import scaffolding_cache
+from blend_api.functions.model_index import invalidate_model_group_index
+
+REPO_NAME = "org/looker"
+NUMBER_OF_FIELDS = 200
+SQL_BYTES = 20_000
+NUMBER_OF_ROLES = 50
+GROUPS_PER_ROLE = 40
+
+
+def make_request(looker_url: str, payload: dict) -> Request:
+    headers = {
+        "X-Base-Url": looker_url,
+        "X-Webhook-Secret": "secret",
+        "X-Personal-Access-Token": "token",
+        "X-Client-Id": "client",
+        "X-Client-Secret": "client_secret",
+    }
+    return Request(
+        EnvironBuilder(
+            method="POST", path="/", json=payload, headers=headers
+        ).get_environ()
+    )
+
+
+@contextmanager
+def stand_ins():
+    role_models = {str(i): ["blends", f"model_{i % 5}"] for i in range(NUMBER_OF_ROLES)}
+    role_groups = {
+        role_id: [str(int(role_id) * 10 + j) for j in range(GROUPS_PER_ROLE)]
+        for role_id in role_models
+    }
+    settings = dict(
+        GITHUB_API_URL=github_client.GITHUB_API_URL,
+        GITHUB_SECONDS_BETWEEN_REQUESTS=github_client.GITHUB_SECONDS_BETWEEN_REQUESTS,
+        GITHUB_SECONDS_BETWEEN_WRITES=github_client.GITHUB_SECONDS_BETWEEN_WRITES,
+    )
+    debounce = deploy_scheduler.debounce
+    with (
+        LookerStandIn(role_models=role_models, role_groups=role_groups) as looker,
+        GitHubStandIn(REPO_NAME) as github,
+    ):
+        github_client.GITHUB_API_URL = github.url
+        github_client.GITHUB_SECONDS_BETWEEN_REQUESTS = 0
+        github_client.GITHUB_SECONDS_BETWEEN_WRITES = 0
+        deploy_scheduler.debounce = 0
+        github_client.github_clients.invalidate()
+        github_client.github_repos.invalidate()
+        scaffolding_cache.invalidate()
+        try:
+            yield looker, github
+        finally:
+            for name, value in settings.items():
+                setattr(github_client, name, value)
+            deploy_scheduler.debounce = debounce
+            github_client.github_clients.invalidate()
+            github_client.github_repos.invalidate()
+            scaffolding_cache.invalidate()
+            invalidate_model_group_index(looker.url)
+
+
+def main(*, quick: bool = False) -> list:
+    repeat = 5 if quick else 30
+    results = []
+    with stand_ins() as (looker, github):
+        uuids = (f"bench_{i}" for i in itertools.count())
+
+        server_timing = {}
+
+        def call(payload: dict) -> dict:
+            response, status, headers = main_module.main(
+                make_request(looker.url, payload)
+            )
+            assert status == 200 and (response.get("ok") or response.get("success")), (
+                response
+            )
+            server_timing["last"] = headers["Server-Timing"]
+            return response
+
+        def scenario(name: str, payload_for, *, cold: bool = False):
+            looker.requests = github.requests = 0
+            if cold:
+                timings = dict(cold_ms=time_once(lambda: call(payload_for())))
+            else:
+                timings = time_calls(lambda: call(payload_for()), repeat=repeat)
+            runs = 1 if cold else repeat + 1
+            result = dict(
+                scenario=name,
+                fields=NUMBER_OF_FIELDS,
+                **timings,
+                github_requests_per_call=round(github.requests / runs, 1),
+                looker_requests_per_call=round(looker.requests / runs, 1),
+                # stage breakdown of the last call, from its Server-Timing header
+                stages=server_timing["last"],
+            )
+            print(result)
+            results.append(result)
+
+        def payload(**overrides) -> dict:
+            return make_payload(
+                NUMBER_OF_FIELDS,
+                sql_bytes=SQL_BYTES,
+                repo_name=REPO_NAME,
+                url=looker.url,
+                **overrides,
+            )
+
+        scenario("dry_run", lambda: payload(dry_run=True))
+        scenario("first_save", lambda: payload(uuid=next(uuids)), cold=True)
+        scenario("new_blend", lambda: payload(uuid=next(uuids)))
+        scenario("unchanged_blend", lambda: payload(uuid="bench_0"))
+        comments = (f"revision {i}" for i in itertools.count())
+        scenario(
+            "changed_blend",
+            lambda: payload(uuid="bench_0", user_commit_comment=next(comments)),
+        )
+        access_grant = dict(
+            dry_run=True,
+            add_access_grant=True,
+            explore_ids=["blends::orders", "model_1::users"],
+        )
+        scenario("access_grant_cold", lambda: payload(**access_grant), cold=True)
+        scenario("access_grant_warm", lambda: payload(**access_grant))
+    return results
+
+
+if __name__ == "__main__":
+    main()
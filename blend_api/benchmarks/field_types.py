@@ -0,0 +1,120 @@
+"""Per-field type resolution: the old get_args walks vs. the precompiled tables.
+
+Run from blend_api/:
+
+    PYTHONPATH=.. python -m blend_api.benchmarks.field_types
+"""
+
+import time
+from typing import get_args
+
+from blend_api.models import (
+    BlendField,
+    MeasureToMeasureEnum,
+    RequestBody,
+    TDimensionFieldType,
+    TMeasureOnlyFieldType,
+)
+
+FIELD_COUNTS = (1_000, 5_000)
+
+
+def legacy_forced_measure_type(field: BlendField):
+    if field.type in get_args(TMeasureOnlyFieldType):
+        return MeasureToMeasureEnum[field.type].value
+
+
+def legacy_forced_dimension_type(field: BlendField):
+    # the type checks from before the lookup tables, minus the logging
+    if field.type.startswith("date_"):
+        if field.type in [
+            "date_month_num",
+            "date_year",
+            "date_day_of_month",
+            "date_day_of_week_index",
+            "date_day_of_year",
+            "date_fiscal_month_num",
+            "date_fiscal_year",
+            "date_hour_of_day",
+            "date_week_of_year",
+        ]:
+            return "number"
+        elif field.type == "date_date":
+            return "date"
+        elif field.type == "date_time":
+            return "date_time"
+        return "string"
+    if field.type in {
+        arg for t in get_args(TDimensionFieldType) for arg in get_args(t)
+    }:
+        return field.type
+    elif field.type in get_args(TMeasureOnlyFieldType):
+        return "number"
+    return "string"
+
+
+def make_fields(number_of_fields: int):
+    # a realistic blend: mostly plain dimensions, some dates, some measures
+    types = ["string", "number", "date_month", "date_year", "sum", "count", "yesno"]
+    return [
+        BlendField(
+            query_uuid=f"q{i % 3}",
+            name=f"view_{i % 7}.field_{i}",
+            sql_alias=f"field_{i}",
+            label_short=f"Field {i}",
+            view_label="View",
+            type=types[i % len(types)],
+            create_measure=i % 5 == 0,
+            field_type="measure" if i % 5 == 0 else "dimension",
+        )
+        for i in range(number_of_fields)
+    ]
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started_at)
+    return min(timings)
+
+
+def main(field_counts=FIELD_COUNTS) -> list:
+    results = []
+    for number_of_fields in field_counts:
+        fields = make_fields(number_of_fields)
+        body = RequestBody(
+            uuid="bench",
+            url="https://example.looker.com",
+            fields=fields,
+            sql="select 1",
+            explore_ids={"model::explore"},
+            project_name="project",
+            repo_name="org/repo",
+            connection_name="conn",
+            lookml_model="blends",
+        )
+        legacy = best_of(
+            lambda: [
+                (legacy_forced_dimension_type(f), legacy_forced_measure_type(f))
+                for f in fields
+            ]
+        )
+        tables = best_of(
+            lambda: [(f.forced_dimension_type, f.forced_measure_type) for f in fields]
+        )
+        render = best_of(body.get_lookml)
+        result = dict(
+            fields=number_of_fields,
+            legacy_types_us_per_field=round(legacy / number_of_fields * 1e6, 2),
+            table_types_us_per_field=round(tables / number_of_fields * 1e6, 2),
+            get_lookml_us_per_field=round(render / number_of_fields * 1e6, 2),
+        )
+        print(result)
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Per-user value joins vs. group-signature memoization.
+
+Run from blend_api/:
+
+    PYTHONPATH=.. python -m blend_api.benchmarks.group_signatures
+"""
+
+import random
+import time
+from types import SimpleNamespace
+
+from blend_api.functions.update_user_attributes import GroupSignatureValues
+
+NUMBER_OF_USERS = 100_000
+NUMBER_OF_GROUPS = 200
+NUMBER_OF_MEMBERSHIPS = 40
+
+
+def make_users(number_of_users: int, seed: int = 0):
+    rng = random.Random(seed)
+    group_ids = [str(i) for i in range(2, NUMBER_OF_GROUPS + 2)]
+    memberships = [
+        ["1", *rng.sample(group_ids, rng.randint(1, 6))]
+        for _ in range(NUMBER_OF_MEMBERSHIPS)
+    ]
+    group_names = {group_id: f"group_{group_id}" for group_id in group_ids}
+    users = [
+        SimpleNamespace(id=str(i), group_ids=list(rng.choice(memberships)))
+        for i in range(number_of_users)
+    ]
+    return users, group_names
+
+
+def per_user_values(users, group_names):
+    values = []
+    for user in users:
+        group_ua_value = [
+            group_names[group_id]
+            for group_id in user.group_ids or []
+            if group_id in group_names
+        ]
+        values.append(",".join(filter(lambda x: x is not None, group_ua_value)))
+    return values
+
+
+def memoized_values(users, group_names):
+    signature_values = GroupSignatureValues(group_names)
+    return [signature_values.value_for(user.group_ids) for user in users]
+
+
+def best_of(fn, *args, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - started_at)
+    return min(timings)
+
+
+def main(number_of_users: int = NUMBER_OF_USERS) -> dict:
+    users, group_names = make_users(number_of_users)
+    per_user = best_of(per_user_values, users, group_names)
+    memoized = best_of(memoized_values, users, group_names)
+    assert memoized_values(users, group_names) == per_user_values(users, group_names)
+    distinct = len(set(map(id, memoized_values(users, group_names))))
+    result = dict(
+        users=number_of_users,
+        distinct_values=distinct,
+        per_user_ms=round(per_user * 1000, 1),
+        memoized_ms=round(memoized * 1000, 1),
+        speedup=round(per_user / memoized, 2),
+    )
+    print(result)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""LookML rendering: the old `out +=` concatenation vs. the single-pass renderer.
+
+Run from blend_api/:
+
+    PYTHONPATH=.. python -m blend_api.benchmarks.lookml_rendering
+"""
+
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from blend_api.benchmarks.field_types import make_fields
+from blend_api.models import LOOKML_TIMESTAMP_PREFIX, AccessGrant, RequestBody
+
+FIELD_COUNTS = (10, 1_000, 10_000)
+# derived SQL for large blends runs to megabytes
+SQL_BYTES = 2_000_000
+
+
+def legacy_field_lookml(field) -> str:
+    sql: str = "${TABLE}." + field.sql_alias
+    out = ""
+    if (
+        field.create_measure
+        and field.field_type == "measure"
+        and field.forced_measure_type
+    ):
+        out += f"""  measure: {field.dimension_name} {{
+    label: "{field.label_short}"
+    view_label: "{field.view_label}"
+    group_label: "{field.group_label}"
+    description: "{field.description}"
+    type: {field.forced_measure_type}
+    sql: {sql} ;;
+  }}
+            """
+    else:
+        out += f"""  dimension: {field.dimension_name} {{
+    label: "{field.label_short}"
+    view_label: "{field.view_label}"
+    group_label: "{field.group_label}"
+    description: "{field.description}"
+    type: {field.forced_dimension_type}
+    sql: {sql} ;;
+  }}
+        """
+    return out
+
+
+def legacy_get_lookml(body: RequestBody, access_grant: AccessGrant | None) -> str:
+    out = f"{LOOKML_TIMESTAMP_PREFIX}{datetime.now(timezone.utc).isoformat()}\n"
+    if body.user_commit_comment:
+        out += f"# {body.user_commit_comment}\n"
+    out += f"# URL: {body.url}/explore/{body.lookml_model}/{body.name}\n"
+    if body.includes:
+        out += f"""
+include: "{body.includes}"
+            """
+    if access_grant:
+        out += f"""
+access_grant: access_grant_{access_grant.uuid} {{
+    user_attribute: {access_grant.user_attribute}
+    allowed_values: [{", ".join(sorted(access_grant.allowed_values))}]
+}}
+        """
+    view = f"""
+view: {body.name} {{
+  derived_table: {{
+    sql: {body.sql} ;;
+  }}
+{"\n".join(legacy_field_lookml(field) for field in body.fields)}
+}}
+        """
+    explore = f"""
+explore: {body.name} {{
+  hidden: yes
+  label: "{body.label_explore}" {("\n" + access_grant.explore_access_grant) if access_grant else ""}
+}}
+"""
+    out += view
+    out += explore
+    return out
+
+
+def measure(fn, repeat: int = 5):
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started_at)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def main(field_counts=FIELD_COUNTS, sql_bytes: int = SQL_BYTES) -> list:
+    access_grant = AccessGrant(
+        uuid="bench", user_attribute="blend_groups", allowed_values={"1", "2"}
+    )
+    results = []
+    for number_of_fields in field_counts:
+        body = RequestBody(
+            uuid="bench",
+            url="https://example.looker.com",
+            fields=make_fields(number_of_fields),
+            sql="select 1 as x\n" * (sql_bytes // 14),
+            explore_ids={"model::explore"},
+            project_name="project",
+            repo_name="org/repo",
+            connection_name="conn",
+            lookml_model="blends",
+            includes="/views/*.view.lkml",
+        )
+        legacy = legacy_get_lookml(body, access_grant).split("\n", 1)[1]
+        assert body.get_lookml(access_grant).split("\n", 1)[1] == legacy
+        legacy_seconds, legacy_peak = measure(
+            lambda: legacy_get_lookml(body, access_grant)
+        )
+        seconds, peak = measure(lambda: body.get_lookml(access_grant))
+        result = dict(
+            fields=number_of_fields,
+            sql_bytes=len(body.sql),
+            legacy_ms=round(legacy_seconds * 1000, 2),
+            renderer_ms=round(seconds * 1000, 2),
+            legacy_peak_kb=legacy_peak // 1024,
+            renderer_peak_kb=peak // 1024,
+        )
+        print(result)
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    main()
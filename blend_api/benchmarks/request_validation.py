@@ -0,0 +1,70 @@
+"""RequestBody validation: dict round trip vs. raw bytes.
+
+Run from blend_api/:
+
+    PYTHONPATH=.. python -m blend_api.benchmarks.request_validation
+"""
+
+import json
+
+from blend_api.benchmarks.field_types import make_fields
+from blend_api.benchmarks.timing import time_calls
+from blend_api.models import RequestBody
+
+FIELD_COUNTS = (10, 1_000, 10_000)
+SQL_BYTES = 200_000
+
+
+def make_payload(
+    number_of_fields: int, *, sql_bytes: int = SQL_BYTES, **overrides
+) -> dict:
+    """A save request body as the extension sends it."""
+    payload = dict(
+        uuid="bench",
+        url="https://example.looker.com",
+        fields=[
+            field.model_dump(mode="json", exclude_none=True)
+            for field in make_fields(number_of_fields)
+        ],
+        sql="select 1 as x\n" * (sql_bytes // 14),
+        explore_ids=["blends::orders", "thelook::users"],
+        project_name="blends",
+        user_attribute="blend_groups",
+        repo_name="org/looker",
+        connection_name="warehouse",
+        lookml_model="blends",
+        includes="/views/*.view.lkml",
+    )
+    payload.update(overrides)
+    return payload
+
+
+def legacy_validate(raw: bytes) -> RequestBody:
+    # what main did before: request.json, then keyword validation
+    return RequestBody(**json.loads(raw))
+
+
+def main(field_counts=FIELD_COUNTS, *, quick: bool = False) -> list:
+    repeat = 3 if quick else 20
+    results = []
+    for number_of_fields in field_counts:
+        raw = json.dumps(make_payload(number_of_fields)).encode()
+        assert legacy_validate(raw) == RequestBody.model_validate_json(raw)
+        legacy = time_calls(lambda: legacy_validate(raw), repeat=repeat)
+        current = time_calls(
+            lambda: RequestBody.model_validate_json(raw), repeat=repeat
+        )
+        result = dict(
+            fields=number_of_fields,
+            body_bytes=len(raw),
+            legacy_median_ms=legacy["median_ms"],
+            **current,
+            speedup=round(legacy["median_ms"] / current["median_ms"], 2),
+        )
+        print(result)
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Runs the benchmark suite and saves the results as JSON.
+
+Everything runs offline: the Looker SDK is stubbed or pointed at local
+stand-in servers, and GitHub is a local stand-in too. Results go to
+benchmarks/results/<timestamp>.json; keep the file from each release and pass
+it to --compare to flag regressions.
+
+Run from blend_api/:
+
+    PYTHONPATH=.. python -m blend_api.benchmarks.run [--quick] [--only NAME ...]
+        [--output PATH] [--compare PATH] [--threshold 0.25]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import structlog
+
+from blend_api.benchmarks import (
+    access_grant,
+    cold_start,
+    end_to_end,
+    lookml_rendering,
+    request_validation,
+    user_attributes,
+)
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(__file__), "results")
+
+SUITES: Dict[str, Callable[..., list]] = {
+    "cold_start": lambda quick: cold_start.main(quick=quick),
+    "request_validation": lambda quick: request_validation.main(quick=quick),
+    "lookml_rendering": lambda quick: lookml_rendering.main(
+        field_counts=(10, 1_000) if quick else (10, 1_000, 10_000)
+    ),
+    "access_grant": lambda quick: access_grant.main(quick=quick),
+    "user_attributes": lambda quick: user_attributes.main(quick=quick),
+    "end_to_end": lambda quick: end_to_end.main(quick=quick),
+}
+
+
+def _git_sha() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _is_timing(key: str) -> bool:
+    return key.endswith("_ms")
+
+
+def _row_key(row: dict) -> tuple:
+    """Identifies a row across runs by its non-timing, non-count parameters."""
+    return tuple(
+        (key, value)
+        for key, value in row.items()
+        if isinstance(value, str) or key in ("fields", "users", "roles")
+    )
+
+
+def compare(baseline: dict, current: dict, *, threshold: float) -> List[str]:
+    """Timings in `current` more than `threshold` slower than in `baseline`."""
+    regressions = []
+    for suite, rows in current["suites"].items():
+        previous = {_row_key(row): row for row in baseline["suites"].get(suite, [])}
+        for row in rows:
+            before = previous.get(_row_key(row))
+            if before is None:
+                continue
+            for key, value in row.items():
+                if not _is_timing(key) or not before.get(key):
+                    continue
+                change = value / before[key] - 1
+                if change > threshold:
+                    regressions.append(
+                        f"{suite} {dict(_row_key(row))} {key}: "
+                        f"{before[key]} -> {value} (+{change:.0%})"
+                    )
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--quick", action="store_true", help="fewer repeats, skip 100k users"
+    )
+    parser.add_argument("--only", nargs="+", choices=sorted(SUITES), default=None)
+    parser.add_argument(
+        "--output", help="results file (default: results/<timestamp>.json)"
+    )
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    # the suites exercise code that logs per call; keep the output to results
+    structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING)
+    )
+
+    started_at = datetime.now(timezone.utc)
+    results = dict(
+        started_at=started_at.isoformat(),
+        git_sha=_git_sha(),
+        python=sys.version.split()[0],
+        platform=platform.platform(),
+        quick=args.quick,
+        suites={},
+    )
+    for name in args.only or SUITES:
+        print(f"== {name}")
+        suite_started_at = time.perf_counter()
+        results["suites"][name] = SUITES[name](args.quick)
+        print(f"   {time.perf_counter() - suite_started_at:.1f}s")
+
+    output = args.output or os.path.join(
+        RESULTS_DIRECTORY, f"{started_at.strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions over {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
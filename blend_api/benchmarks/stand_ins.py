@@ -0,0 +1,176 @@
+"""Local stand-ins for the GitHub and Looker APIs, so benchmarks run offline.
+
+Each server answers only the endpoints blend_api calls, with just enough of
+the real payloads for PyGithub and the Looker SDK to deserialize them.
+"""
+
+import base64
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+TRoute = Tuple[str, re.Pattern, Callable]
+
+
+class StandInServer:
+    """Threaded HTTP server on a free localhost port; use as a context manager."""
+
+    def __init__(self):
+        self.routes: List[TRoute] = []
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body go out in separate writes; without this the
+            # delayed-ACK interaction adds ~40ms to every keep-alive response
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _handle(self):
+                server.requests += 1
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                for method, pattern, handler in server.routes:
+                    match = pattern.fullmatch(url.path)
+                    if method == self.command and match:
+                        status, payload = handler(
+                            *match.groups(), query=parse_qs(url.query), body=body
+                        )
+                        break
+                else:
+                    status, payload = 404, {"message": "Not Found"}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def route(self, method: str, path: str, handler: Callable) -> None:
+        self.routes.append((method, re.compile(path), handler))
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class LookerStandIn(StandInServer):
+    """Login, roles, role groups and the project deploy webhook."""
+
+    def __init__(
+        self,
+        *,
+        role_models: Dict[str, List[str]],
+        role_groups: Dict[str, List[str]],
+    ):
+        super().__init__()
+        self.role_models = role_models
+        self.role_groups = role_groups
+        self.deploys = 0
+        self.route("POST", r"/api/4\.0/login", self._login)
+        self.route("GET", r"/api/4\.0/roles", self._roles)
+        self.route("GET", r"/api/4\.0/roles/([^/]+)/groups", self._groups)
+        self.route("POST", r"/webhooks/projects/([^/]+)/deploy", self._deploy)
+
+    def _login(self, query, body):
+        return 200, {
+            "access_token": "token",
+            "token_type": "Bearer",
+            "expires_in": 3600,
+        }
+
+    def _roles(self, query, body):
+        return 200, [
+            {"id": role_id, "model_set": {"models": models}}
+            for role_id, models in self.role_models.items()
+        ]
+
+    def _groups(self, role_id, query, body):
+        return 200, [
+            {"id": group_id, "name": f"group_{group_id}"}
+            for group_id in self.role_groups.get(role_id, [])
+        ]
+
+    def _deploy(self, project_name, query, body):
+        self.deploys += 1
+        return 200, {}
+
+
+class GitHubStandIn(StandInServer):
+    """An in-memory repository behind the repos, contents and commit endpoints."""
+
+    def __init__(self, repo_name: str, *, default_branch: str = "main"):
+        super().__init__()
+        self.repo_name = repo_name
+        self.default_branch = default_branch
+        self.files: Dict[str, str] = {}
+        self.commits = 0
+        repo = re.escape(repo_name)
+        self.route("GET", rf"/repos/{repo}", self._repo)
+        self.route("GET", rf"/repos/{repo}/contents/(.+)", self._get_contents)
+        self.route("PUT", rf"/repos/{repo}/contents/(.+)", self._put_contents)
+
+    @property
+    def repo_url(self) -> str:
+        return f"{self.url}/repos/{self.repo_name}"
+
+    def _repo(self, query, body):
+        return 200, {
+            "id": 1,
+            "name": self.repo_name.split("/")[-1],
+            "full_name": self.repo_name,
+            "default_branch": self.default_branch,
+            "url": self.repo_url,
+        }
+
+    def _content(self, path: str, content: str | None = None) -> dict:
+        entry = {
+            "type": "file" if content is not None else "dir",
+            "name": path.rsplit("/", 1)[-1],
+            "path": path,
+            "sha": hashlib.sha1((content or path).encode()).hexdigest(),
+            "url": f"{self.repo_url}/contents/{path}",
+        }
+        if content is not None:
+            entry.update(
+                encoding="base64",
+                size=len(content),
+                content=base64.b64encode(content.encode()).decode(),
+            )
+        return entry
+
+    def _get_contents(self, path, query, body):
+        if path in self.files:
+            return 200, self._content(path, self.files[path])
+        children = [p for p in self.files if p.startswith(path + "/")]
+        if not children:
+            return 404, {"message": "Not Found"}
+        return 200, [self._content(p, self.files[p]) for p in children]
+
+    def _put_contents(self, path, query, body):
+        data = json.loads(body)
+        created = path not in self.files
+        self.files[path] = base64.b64decode(data["content"]).decode()
+        self.commits += 1
+        return 201 if created else 200, {
+            "content": self._content(path, self.files[path]),
+            "commit": {"sha": f"{self.commits:040x}"},
+        }
@@ -0,0 +1,31 @@
+"""Timing helpers shared by the benchmark suite."""
+
+import statistics
+import time
+from typing import Callable, Dict
+
+
+def time_calls(
+    fn: Callable[[], object], *, repeat: int, warmup: int = 1
+) -> Dict[str, float]:
+    """Best, median and p95 wall time of `fn` in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started_at) * 1000)
+    timings.sort()
+    return dict(
+        best_ms=round(timings[0], 3),
+        median_ms=round(statistics.median(timings), 3),
+        p95_ms=round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+    )
+
+
+def time_once(fn: Callable[[], object]) -> float:
+    """Wall time of a single call in milliseconds, for runs too slow to repeat."""
+    started_at = time.perf_counter()
+    fn()
+    return round((time.perf_counter() - started_at) * 1000, 3)
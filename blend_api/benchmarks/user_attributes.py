@@ -0,0 +1,124 @@
+"""update_user_attributes against a stubbed Looker SDK at instance scale.
+
+Each size runs a full sync and then an incremental sync with no membership
+changes, each against a fresh checkpoint database.
+
+Run from blend_api/:
+
+    PYTHONPATH=.. python -m blend_api.benchmarks.user_attributes
+"""
+
+import os
+import random
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+from blend_api.benchmarks.timing import time_once
+from blend_api.functions import update_user_attributes as module
+from blend_api.functions.group_names import group_names_cache
+from blend_api.functions.sync_checkpoints import SqliteSyncCheckpointStore
+from blend_api.functions.update_user_attributes import update_user_attributes
+
+USER_COUNTS = (1_000, 10_000, 100_000)
+QUICK_USER_COUNTS = (1_000, 10_000)
+NUMBER_OF_GROUPS = 500
+NUMBER_OF_MEMBERSHIPS = 200
+# simulated round trips for a page of users and for one attribute write
+SEARCH_LATENCY_SECONDS = 0.005
+WRITE_LATENCY_SECONDS = 0.0005
+
+
+class StubSdk:
+    def __init__(self, number_of_users: int, *, seed: int = 0):
+        rng = random.Random(seed)
+        group_ids = [str(i) for i in range(2, NUMBER_OF_GROUPS + 2)]
+        memberships = [
+            ["1", *rng.sample(group_ids, rng.randint(1, 6))]
+            for _ in range(NUMBER_OF_MEMBERSHIPS)
+        ]
+        self.users = [
+            SimpleNamespace(id=str(i), group_ids=list(rng.choice(memberships)))
+            for i in range(number_of_users)
+        ]
+        self.groups = {group_id: f"group_{group_id}" for group_id in group_ids}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self, latency: float):
+        with self._lock:
+            self.calls += 1
+        time.sleep(latency)
+
+    def get(self, path, structure=None):
+        return [{"name": "blend_groups", "id": "9"}]
+
+    def user_attribute(self, user_attribute_id, fields=None):
+        return SimpleNamespace(type="advanced_filter_string")
+
+    def search_users(self, *, limit, offset, **kwargs):
+        self._call(SEARCH_LATENCY_SECONDS)
+        return self.users[offset : offset + limit]
+
+    def search_groups(self, id, fields=None, limit=None):
+        self._call(SEARCH_LATENCY_SECONDS)
+        return [
+            SimpleNamespace(id=group_id, name=self.groups[group_id])
+            for group_id in id.split(",")
+            if group_id in self.groups
+        ]
+
+    def set_user_attribute_user_value(self, *, user_id, user_attribute_id, body):
+        self._call(WRITE_LATENCY_SECONDS)
+
+
+def main(user_counts=USER_COUNTS, *, quick: bool = False) -> list:
+    if quick:
+        user_counts = [count for count in user_counts if count in QUICK_USER_COUNTS]
+    original_get_sdk = module.get_sdk
+    original_store = module.checkpoint_store
+    results = []
+    try:
+        for number_of_users in user_counts:
+            sdk = StubSdk(number_of_users)
+            module.get_sdk = lambda *args: sdk
+            with tempfile.TemporaryDirectory() as directory:
+                module.checkpoint_store = SqliteSyncCheckpointStore(
+                    os.path.join(directory, "sync.sqlite3")
+                )
+                group_names_cache.invalidate()
+
+                def run(**kwargs):
+                    response = update_user_attributes(
+                        sdk_base_url="https://example.looker.com",
+                        sdk_client_id="client",
+                        sdk_client_secret="secret",
+                        user_attribute="blend_groups",
+                        **kwargs,
+                    )
+                    assert response["success"], response
+                    assert response["number_of_users"] == number_of_users
+
+                full_ms = time_once(run)
+                full_calls, sdk.calls = sdk.calls, 0
+                incremental_ms = time_once(lambda: run(incremental=True))
+            result = dict(
+                users=number_of_users,
+                full_ms=full_ms,
+                full_sdk_calls=full_calls,
+                full_users_per_s=round(number_of_users / (full_ms / 1000)),
+                incremental_ms=incremental_ms,
+                incremental_sdk_calls=sdk.calls,
+            )
+            print(result)
+            results.append(result)
+    finally:
+        module.get_sdk = original_get_sdk
+        module.checkpoint_store = original_store
+        group_names_cache.invalidate()
+    return results
+
+
+if __name__ == "__main__":
+    main()
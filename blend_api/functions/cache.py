@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Tuple, TypeVar
+
+from structlog import get_logger
+
+logger = get_logger()
+
+# no request outlives the function timeout, so a pooled client evicted this long
+# ago can no longer be in use by a request that fetched it just before eviction
+FUNCTION_TIMEOUT_SECONDS = float(os.environ.get("FUNCTION_TIMEOUT_SECONDS", "60"))
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after being stored.
+
+    With `sliding`, the expiry instead counts from the last `get`, so only idle
+    entries expire. `on_evict` runs `evict_delay` seconds after an entry is
+    dropped, for values such as clients that a caller may still be using.
+    """
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        max_size: int,
+        ttl: float,
+        on_evict: Callable[[K, V], None] | None = None,
+        sliding: bool = False,
+        evict_delay: float = 0,
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.sliding = sliding
+        self.evict_delay = evict_delay
+        self._entries: OrderedDict[K, Tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, key: K, value: V, reason: str) -> None:
+        logger.debug("Cache evict", cache=self.name, reason=reason)
+        if not self.on_evict:
+            return
+        if self.evict_delay > 0:
+            timer = threading.Timer(self.evict_delay, self._run_on_evict, (key, value))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._run_on_evict(key, value)
+
+    def _run_on_evict(self, key: K, value: V) -> None:
+        try:
+            self.on_evict(key, value)
+        except Exception as e:
+            logger.warning("Cache evict callback failed", cache=self.name, error=str(e))
+
+    def get(self, key: K) -> V | None:
+        evicted: Tuple[float, V] | None = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                logger.debug("Cache miss", cache=self.name)
+                return None
+            stored_at, value = entry
+            now = time.monotonic()
+            age = now - stored_at
+            if age >= self.ttl:
+                evicted = self._entries.pop(key)
+            else:
+                self._entries.move_to_end(key)
+                if self.sliding:
+                    self._entries[key] = (now, value)
+        if evicted is not None:
+            logger.debug("Cache stale", cache=self.name, age=round(age, 3))
+            self._evict(key, evicted[1], "expired")
+            return None
+        logger.debug("Cache hit", cache=self.name, age=round(age, 3))
+        return value
+
+    def set(self, key: K, value: V) -> V:
+        evicted: list[Tuple[K, V]] = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None and previous[1] is not value:
+                evicted.append((key, previous[1]))
+            self._entries[key] = (time.monotonic(), value)
+            while len(self._entries) > self.max_size:
+                old_key, (_, old_value) = self._entries.popitem(last=False)
+                evicted.append((old_key, old_value))
+        for old_key, old_value in evicted:
+            self._evict(old_key, old_value, "replaced" if old_key == key else "lru")
+        return value
+
+    def get_or_create(self, key: K, factory: Callable[[], V]) -> V:
+        value = self.get(key)
+        if value is not None:
+            return value
+        created = factory()
+        with self._lock:
+            # another thread may have created the entry while we were building ours
+            entry = self._entries.get(key)
+            existing = entry[1] if entry is not None else None
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+            else:
+                existing = None
+        if existing is not None:
+            self._evict(key, created, "duplicate")
+            return existing
+        return self.set(key, created)
+
+    def invalidate(self, key: K | None = None) -> None:
+        with self._lock:
+            if key is None:
+                evicted = list(self._entries.items())
+                self._entries.clear()
+            else:
+                entry = self._entries.pop(key, None)
+                evicted = [(key, entry)] if entry is not None else []
+        for old_key, (_, old_value) in evicted:
+            self._evict(old_key, old_value, "invalidated")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,85 @@
+import re
+import threading
+import time
+
+from structlog import get_logger
+
+logger = get_logger()
+
+# Looker API errors link to docs like .../r/err/4.0/429/patch/users/:user_id
+_LOOKER_ERROR_STATUS = re.compile(r"/err/[^/]+/(\d{3})/")
+
+
+def looker_error_status(error: Exception) -> int | None:
+    """The HTTP status of a Looker SDK error, when the error body carries one."""
+    documentation_url = getattr(error, "documentation_url", None) or ""
+    match = _LOOKER_ERROR_STATUS.search(documentation_url)
+    return int(match.group(1)) if match else None
+
+
+class AdaptiveConcurrency:
+    """Additive-increase / multiplicative-decrease limit on concurrent calls.
+
+    Every call that finishes within `target_latency` grows the limit by
+    1/limit, so it rises by one per round of calls. A throttled call halves
+    it, at most once per `cooldown` seconds so a single burst of 429s does not
+    collapse it to the minimum.
+    """
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        target_latency: float,
+        cooldown: float = 1.0,
+    ):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.cooldown = cooldown
+        self.lowest = self.highest = initial
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._started_at = time.monotonic()
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, *, latency: float, throttled: bool = False) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            previous = int(self._limit)
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease >= self.cooldown:
+                    self._last_decrease = now
+                    self._limit = max(self.minimum, self._limit / 2)
+            elif latency <= self.target_latency:
+                self._limit = min(self.maximum, self._limit + 1 / self._limit)
+            current = int(self._limit)
+            self.lowest = min(self.lowest, current)
+            self.highest = max(self.highest, current)
+            self._condition.notify_all()
+        if current != previous:
+            logger.info(
+                "Concurrency changed",
+                limiter=self.name,
+                concurrency=current,
+                previous=previous,
+                throttled=throttled,
+                latency=round(latency, 3),
+                elapsed=round(now - self._started_at, 1),
+            )
@@ -0,0 +1,274 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, Tuple
+
+import requests
+from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
+from structlog import get_logger
+
+from .cache import FUNCTION_TIMEOUT_SECONDS, TTLCache
+
+logger = get_logger(__name__)
+
+# A deploy waits until no other save for the same project has arrived for
+# DEPLOY_DEBOUNCE_SECONDS, but never longer than DEPLOY_MAX_WAIT_SECONDS.
+# Off by default: every save deploys immediately.
+DEPLOY_DEBOUNCE_SECONDS = float(os.environ.get("DEPLOY_DEBOUNCE_SECONDS", "0"))
+DEPLOY_MAX_WAIT_SECONDS = float(os.environ.get("DEPLOY_MAX_WAIT_SECONDS", "3"))
+
+DEPLOY_CONNECT_TIMEOUT_SECONDS = float(
+    os.environ.get("DEPLOY_CONNECT_TIMEOUT_SECONDS", "5")
+)
+DEPLOY_READ_TIMEOUT_SECONDS = float(
+    os.environ.get("DEPLOY_READ_TIMEOUT_SECONDS", "120")
+)
+DEPLOY_MAX_ATTEMPTS = int(os.environ.get("DEPLOY_MAX_ATTEMPTS", "4"))
+# all attempts of one deploy, backoff included, end within this; keep it below
+# the function timeout so a failing deploy is reported rather than killed
+DEPLOY_DEADLINE_SECONDS = float(os.environ.get("DEPLOY_DEADLINE_SECONDS", "40"))
+DEPLOY_BACKOFF_BASE_SECONDS = float(
+    os.environ.get("DEPLOY_BACKOFF_BASE_SECONDS", "0.5")
+)
+DEPLOY_BACKOFF_MAX_SECONDS = float(os.environ.get("DEPLOY_BACKOFF_MAX_SECONDS", "8"))
+# every deploy earns DEPLOY_RETRY_BUDGET_RATIO retries, up to DEPLOY_RETRY_BUDGET_MAX
+# banked per host, so a struggling Looker instance is not hammered with retries
+DEPLOY_RETRY_BUDGET_RATIO = float(os.environ.get("DEPLOY_RETRY_BUDGET_RATIO", "0.2"))
+DEPLOY_RETRY_BUDGET_MAX = float(os.environ.get("DEPLOY_RETRY_BUDGET_MAX", "10"))
+
+# safe to retry for idempotent calls, such as writing a user attribute value
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# a deploy is not idempotent: after a 500 or 504 Looker may already be deploying,
+# the same unknown outcome as a read timeout, so only retry statuses that mean
+# the webhook was turned away before it ran
+DEPLOY_RETRYABLE_STATUS_CODES = {429, 502, 503}
+
+TDeployKey = Tuple[str, str, str]
+
+
+class DeployResult(BaseModel):
+    success: bool
+    error: str | None = None
+    coalesced: int = 1
+    attempts: int = 0
+    latency_ms: float = 0
+
+
+class RetryBudget:
+    def __init__(self, *, ratio: float, max_tokens: float):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class _HostClient:
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=10))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=10))
+        self.retry_budget = RetryBudget(
+            ratio=DEPLOY_RETRY_BUDGET_RATIO, max_tokens=DEPLOY_RETRY_BUDGET_MAX
+        )
+
+
+host_clients: TTLCache[str, _HostClient] = TTLCache(
+    name="deploy_sessions",
+    max_size=32,
+    ttl=3600,
+    on_evict=lambda key, client: client.session.close(),
+    sliding=True,
+    evict_delay=FUNCTION_TIMEOUT_SECONDS,
+)
+
+
+def _backoff(attempt: int, retry_after: str | None) -> float:
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), DEPLOY_BACKOFF_MAX_SECONDS)
+    # full jitter: uniform between 0 and the exponential ceiling
+    ceiling = min(
+        DEPLOY_BACKOFF_MAX_SECONDS, DEPLOY_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)
+    )
+    return random.uniform(0, ceiling)
+
+
+def call_deploy_webhook(
+    *, sdk_base_url: str, project_name: str, webhook_secret: str
+) -> DeployResult:
+    logger.debug("Calling deploy webhook", project_name=project_name)
+    url = f"{sdk_base_url}/webhooks/projects/{project_name}/deploy"
+    client = host_clients.get_or_create(sdk_base_url.rstrip("/"), _HostClient)
+    client.retry_budget.deposit()
+    result = DeployResult(success=False)
+    started_at = time.monotonic()
+    deadline = started_at + DEPLOY_DEADLINE_SECONDS
+    while True:
+        result.attempts += 1
+        retry_after: str | None = None
+        remaining = max(deadline - time.monotonic(), 0.1)
+        try:
+            response = client.session.post(
+                url,
+                headers={
+                    "X-Looker-Deploy-Secret": webhook_secret,
+                    "Content-Type": "application/json",
+                },
+                timeout=(
+                    min(DEPLOY_CONNECT_TIMEOUT_SECONDS, remaining),
+                    min(DEPLOY_READ_TIMEOUT_SECONDS, remaining),
+                ),
+            )
+            if response.status_code == 200:
+                result.success = True
+                result.error = None
+                break
+            logger.error(
+                "Deploy webhook failed",
+                status_code=response.status_code,
+                response=response.text,
+                attempt=result.attempts,
+            )
+            result.error = response.text
+            retryable = response.status_code in DEPLOY_RETRYABLE_STATUS_CODES
+            retry_after = response.headers.get("Retry-After")
+        except requests.ConnectionError as e:
+            # includes ConnectTimeout: the request never reached Looker
+            logger.error(
+                "Error calling deploy webhook", error=str(e), attempt=result.attempts
+            )
+            result.error = str(e)
+            retryable = True
+        except requests.Timeout as e:
+            # Looker may already be deploying; a retry would deploy again
+            logger.error(
+                "Deploy webhook timed out", error=str(e), attempt=result.attempts
+            )
+            result.error = str(e)
+            retryable = False
+        except Exception as e:
+            logger.error("Error calling deploy webhook", error=str(e))
+            result.error = str(e)
+            retryable = False
+        if not retryable or result.attempts >= DEPLOY_MAX_ATTEMPTS:
+            break
+        delay = _backoff(result.attempts, retry_after)
+        if time.monotonic() + delay + DEPLOY_CONNECT_TIMEOUT_SECONDS > deadline:
+            logger.warning("Deploy deadline reached", project_name=project_name)
+            break
+        if not client.retry_budget.withdraw():
+            logger.warning("Deploy retry budget exhausted", project_name=project_name)
+            break
+        time.sleep(delay)
+    result.latency_ms = round((time.monotonic() - started_at) * 1000, 1)
+    logger.info(
+        "Deploy webhook finished",
+        project_name=project_name,
+        success=result.success,
+        attempts=result.attempts,
+        latency_ms=result.latency_ms,
+    )
+    return result
+
+
+class _PendingDeploy:
+    def __init__(self):
+        self.result: Future[DeployResult] = Future()
+        self.started_at = time.monotonic()
+        self.last_request_at = self.started_at
+        self.requests = 0
+
+
+class DeployScheduler:
+    """Coalesces deploy webhook calls per (host, project).
+
+    The first caller for a project waits out the debounce window and runs a
+    single deploy; every caller that joined during the window gets its result.
+    Callers arriving while that deploy runs start the next window, so their
+    commits are always picked up.
+    """
+
+    def __init__(self, *, debounce: float, max_wait: float):
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self._pending: Dict[TDeployKey, _PendingDeploy] = {}
+        self._lock = threading.Lock()
+
+    def deploy(
+        self, *, sdk_base_url: str, project_name: str, webhook_secret: str
+    ) -> DeployResult:
+        if self.debounce <= 0:
+            return call_deploy_webhook(
+                sdk_base_url=sdk_base_url,
+                project_name=project_name,
+                webhook_secret=webhook_secret,
+            )
+        key = (
+            sdk_base_url.rstrip("/"),
+            project_name,
+            hashlib.sha256(webhook_secret.encode()).hexdigest(),
+        )
+        with self._lock:
+            pending = self._pending.get(key)
+            leader = pending is None
+            if pending is None:
+                pending = self._pending[key] = _PendingDeploy()
+            pending.requests += 1
+            pending.last_request_at = time.monotonic()
+        if not leader:
+            logger.debug("Joining pending deploy", project_name=project_name)
+            # the leader deploys within max_wait plus the deploy deadline
+            timeout = self.max_wait + DEPLOY_DEADLINE_SECONDS + 1
+            try:
+                return pending.result.result(timeout=timeout)
+            except FutureTimeoutError:
+                logger.error("Timed out waiting for deploy", project_name=project_name)
+                return DeployResult(
+                    success=False,
+                    error=f"Timed out after {timeout:.0f}s waiting for deploy",
+                    coalesced=pending.requests,
+                )
+
+        deadline = pending.started_at + self.max_wait
+        while True:
+            with self._lock:
+                wake_at = min(pending.last_request_at + self.debounce, deadline)
+            remaining = wake_at - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(remaining)
+        with self._lock:
+            del self._pending[key]
+            coalesced = pending.requests
+
+        logger.info(
+            "Running coalesced deploy", project_name=project_name, coalesced=coalesced
+        )
+        result = call_deploy_webhook(
+            sdk_base_url=sdk_base_url,
+            project_name=project_name,
+            webhook_secret=webhook_secret,
+        )
+        result.coalesced = coalesced
+        pending.result.set_result(result)
+        return result
+
+
+deploy_scheduler = DeployScheduler(
+    debounce=DEPLOY_DEBOUNCE_SECONDS, max_wait=DEPLOY_MAX_WAIT_SECONDS
+)
@@ -1,11 +1,16 @@
-import os
-from typing import Dict, List, Literal, Set, TypedDict, cast
+import time
+from typing import Literal, Set, TypedDict, cast
 
-from looker_sdk.sdk.api40.models import Group
 from structlog import get_logger
 
 from ..models import AccessGrant
-from .utils import get_sdk
+from .model_index import (
+    MODEL_INDEX_MIN_REFRESH_SECONDS,
+    get_model_group_index,
+    refresh_model_group_index,
+)
+from .role_topology import GroupId
+from .utils import ensure_authenticated, get_sdk
 
 logger = get_logger()
 
@@ -21,18 +26,6 @@ class AccessGrantError(TypedDict):
     access_grant: None
 
 
-class ModelName(str):
-    pass
-
-
-class RoleId(str):
-    pass
-
-
-class GroupId(str):
-    pass
-
-
 def get_access_grant(
     *,
     sdk_client_id: str,
@@ -50,60 +43,38 @@ def get_access_grant(
             error="No models provided",
         )
     sdk = get_sdk(sdk_client_id, sdk_client_secret, sdk_base_url)
-    model_groups: Dict[ModelName, Set[GroupId]] = {
-        cast(ModelName, k): cast(Set[GroupId], set()) for k in models
-    }
-    model_roles: Dict[ModelName, Set[RoleId]] = {
-        cast(ModelName, k): cast(Set[RoleId], set()) for k in models
-    }
-    all_groups: List[Group] = []
-
-    # Get all roles
-    # filter only roles that have models from the method argument
-    # for each filtered role, get the groups
-    # compare the groups from each model
-    # return the intersection of groups
-
-    roles = sdk.all_roles()
-    for role in roles:
-        for model_name in models:
-            if role.model_set and model_name in cast(Set[str], role.model_set.models):
-                model_roles[cast(ModelName, model_name)].add(cast(RoleId, role.id))
-
-    for model_name in models:
-        model_role_set = model_roles[cast(ModelName, model_name)]
-        for role_id in model_role_set:
-            role_groups = sdk.role_groups(role_id)
-            all_groups.extend(role_groups)
-            model_groups[cast(ModelName, model_name)].update(
-                [cast(GroupId, group.id) for group in role_groups]
-            )
-
-    group_intersection = set()
-    for i, model_name in enumerate(models):
-        if i == 0:
-            group_intersection = model_groups[cast(ModelName, model_name)]
-        else:
-            group_intersection = group_intersection.intersection(
-                model_groups[cast(ModelName, model_name)]
-            )
+    # the index below is shared per host, so the credentials are checked here
+    ensure_authenticated(sdk)
+
+    # The index maps each model to the groups reachable through its roles,
+    # so the groups allowed on the blend are the intersection across models.
+    started_at = time.monotonic()
+    index = get_model_group_index(sdk, sdk_base_url)
+    filtered_groups: Set[GroupId] = index.groups_for_models(sdk, models)
+    if len(filtered_groups) == 0 and index.created_at < started_at:
+        # roles may have been granted since the index was built
+        logger.info(
+            "No intersection groups in cached model group index, refreshing",
+            sdk_base_url=sdk_base_url,
+            age=round(index.age, 3),
+        )
+        # the models' roles may also have gained groups
+        index = refresh_model_group_index(
+            sdk,
+            sdk_base_url,
+            min_age=MODEL_INDEX_MIN_REFRESH_SECONDS,
+            recheck_models=models,
+        )
+        filtered_groups = index.groups_for_models(sdk, models)
 
-    filtered_groups = set(
-        [
-            cast(GroupId, group.id)
-            for group in all_groups
-            if group.id in cast(Set[str], group_intersection)
-        ]
-    )
     if len(filtered_groups) == 0:
         logger.error(
             "No intersection groups found",
             models=list(models),
-            all_groups=all_groups,
-            group_intersection=group_intersection,
-            roles=roles,
-            model_groups=model_groups,
-            model_roles=model_roles,
+            model_groups={
+                model_name: sorted(index.groups_for_model(model_name))
+                for model_name in models
+            },
             sdk_base_url=sdk_base_url,
         )
         return dict(
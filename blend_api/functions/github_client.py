@@ -0,0 +1,71 @@
+import hashlib
+import os
+from typing import Tuple
+
+from github import Auth, Github
+from github.Repository import Repository
+
+from .cache import FUNCTION_TIMEOUT_SECONDS, TTLCache
+from .timing import timed
+
+GITHUB_CLIENT_MAX_SIZE = int(os.environ.get("GITHUB_CLIENT_MAX_SIZE", "32"))
+GITHUB_CLIENT_TTL_SECONDS = float(os.environ.get("GITHUB_CLIENT_TTL_SECONDS", "3600"))
+GITHUB_REPO_TTL_SECONDS = float(os.environ.get("GITHUB_REPO_TTL_SECONDS", "600"))
+# GitHub Enterprise hosts serve the API from https://<host>/api/v3
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+# PyGithub spaces requests out per client; these are its defaults
+GITHUB_SECONDS_BETWEEN_REQUESTS = float(
+    os.environ.get("GITHUB_SECONDS_BETWEEN_REQUESTS", "0.25")
+)
+GITHUB_SECONDS_BETWEEN_WRITES = float(
+    os.environ.get("GITHUB_SECONDS_BETWEEN_WRITES", "1")
+)
+
+
+def _token_hash(personal_access_token: str) -> str:
+    return hashlib.sha256(personal_access_token.encode()).hexdigest()
+
+
+github_clients: TTLCache[str, Github] = TTLCache(
+    name="github_clients",
+    max_size=GITHUB_CLIENT_MAX_SIZE,
+    ttl=GITHUB_CLIENT_TTL_SECONDS,
+    on_evict=lambda key, g: g.close(),
+    sliding=True,
+    evict_delay=FUNCTION_TIMEOUT_SECONDS,
+)
+github_repos: TTLCache[Tuple[str, str], Repository] = TTLCache(
+    name="github_repos",
+    max_size=GITHUB_CLIENT_MAX_SIZE * 4,
+    ttl=GITHUB_REPO_TTL_SECONDS,
+)
+
+
+def get_github(personal_access_token: str) -> Github:
+    """Authenticated client per token; its HTTP session is reused across saves."""
+    return github_clients.get_or_create(
+        _token_hash(personal_access_token),
+        lambda: Github(
+            auth=Auth.Token(personal_access_token),
+            base_url=GITHUB_API_URL,
+            seconds_between_requests=GITHUB_SECONDS_BETWEEN_REQUESTS,
+            seconds_between_writes=GITHUB_SECONDS_BETWEEN_WRITES,
+        ),
+    )
+
+
+def _fetch_repo(personal_access_token: str, repo_name: str) -> Repository:
+    with timed("github_get_repo"):
+        return get_github(personal_access_token).get_repo(repo_name)
+
+
+def get_github_repo(personal_access_token: str, repo_name: str) -> Repository:
+    """Resolved repository handle, so steady-state saves skip the get_repo round trip."""
+    return github_repos.get_or_create(
+        (_token_hash(personal_access_token), repo_name),
+        lambda: _fetch_repo(personal_access_token, repo_name),
+    )
+
+
+def invalidate_github_repo(personal_access_token: str, repo_name: str) -> None:
+    github_repos.invalidate((_token_hash(personal_access_token), repo_name))
@@ -1,26 +1,342 @@
-import requests
-from github import Auth, Github
+import base64
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set, Tuple
+
+from github import GithubException, InputGitTreeElement
+from github.ContentFile import ContentFile
+from github.Repository import Repository
 from structlog import get_logger
 from pydantic import BaseModel
 
+from ..models import lookml_fingerprint
+from .cache import TTLCache
+from .deploy import deploy_scheduler
+from .github_client import get_github_repo, invalidate_github_repo
+from .timing import timed
+
 logger = get_logger(__name__)
 
+# write every file of a save in one commit through the Git Data API
+GITHUB_SINGLE_COMMIT = os.environ.get("GITHUB_SINGLE_COMMIT") == "true"
+GITHUB_REF_UPDATE_ATTEMPTS = 3
+GITHUB_SCAFFOLDING_TTL_SECONDS = float(
+    os.environ.get("GITHUB_SCAFFOLDING_TTL_SECONDS", "86400")
+)
+
+GITHUB_BLOB_FETCH_WORKERS = int(os.environ.get("GITHUB_BLOB_FETCH_WORKERS", "8"))
+
+# (repo_name, lookml_model) -> paths under blends/ already known to exist
+scaffolding_cache: TTLCache[Tuple[str, str], Set[str]] = TTLCache(
+    name="github_scaffolding",
+    max_size=1024,
+    ttl=GITHUB_SCAFFOLDING_TTL_SECONDS,
+)
+# git blob sha -> lookml_fingerprint of its content; blobs are addressed by
+# content, so entries never go stale and the TTL only bounds memory
+blob_fingerprints: TTLCache[str, str] = TTLCache(
+    name="github_blob_fingerprints",
+    max_size=10_000,
+    ttl=GITHUB_SCAFFOLDING_TTL_SECONDS,
+)
+
 class ResponseFile(BaseModel):
     success: bool
     filename: str
     repo: str
     error: str | None = None
+    commit_sha: str | None = None
+    unchanged: bool = False
 
 class ResponseDeploy(BaseModel):
     success: bool
     project_name: str
     error: str | None = None
+    skipped: bool = False
+    coalesced: int = 1
+    attempts: int = 0
+    latency_ms: float = 0
 
 class Response(BaseModel):
     file: ResponseFile
     deploy: ResponseDeploy
 
 
+class BatchBlend(BaseModel):
+    uuid: str
+    lookml_model: str
+    connection_name: str
+    lookml: str
+
+
+class ResponseBatch(BaseModel):
+    success: bool
+    repo: str
+    filenames: List[str]
+    commit_sha: str | None = None
+    error: str | None = None
+    # blends whose file already held the same LookML and was left as it was
+    unchanged_filenames: List[str] = []
+    deploy: ResponseDeploy
+
+
+def blend_filename(lookml_model: str, uuid: str) -> str:
+    return f"blends/{lookml_model}/{uuid}.explore.lkml"
+
+
+def model_filename(lookml_model: str) -> str:
+    return f"blends/{lookml_model}/{lookml_model}.model.lkml"
+
+
+def model_file_content(connection_name: str) -> str:
+    return f'connection: "{connection_name}"\ninclude: "*.explore.lkml"'
+
+
+def git_blob_sha(content: str) -> str:
+    """The sha git gives a blob holding `content`."""
+    data = content.encode()
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def commit_files(
+    repo: Repository, files: Dict[str, str], message: str
+) -> str | None:
+    """Writes `files` (path -> content) to the default branch as a single commit.
+
+    Uses the Git Data API: read the branch head, create one tree with every file
+    inlined, create one commit and move the branch ref. If the branch moves
+    underneath us the commit is rebuilt on the new head. Returns the commit sha,
+    or None without committing when the branch already holds exactly `files`.
+    """
+    with timed("github_get_ref"):
+        ref = repo.get_git_ref(f"heads/{repo.default_branch}")
+    elements = [
+        InputGitTreeElement(path=path, mode="100644", type="blob", content=content)
+        for path, content in files.items()
+    ]
+    attempt = 1
+    while True:
+        with timed("github_get_branch"):
+            head = repo.get_branch(repo.default_branch).commit.commit
+        with timed("github_create_tree"):
+            tree = repo.create_git_tree(elements, base_tree=head.tree)
+        if tree.sha == head.tree.sha:
+            logger.debug("Files already committed", repo_name=repo.full_name)
+            return None
+        with timed("github_create_commit"):
+            commit = repo.create_git_commit(message, tree, [head])
+        try:
+            with timed("github_update_ref"):
+                ref.edit(commit.sha)
+            for content in files.values():
+                blob_fingerprints.set(
+                    git_blob_sha(content), lookml_fingerprint(content)
+                )
+            return commit.sha
+        except GithubException as e:
+            # 422: not a fast-forward, someone else committed since we read the head
+            if e.status != 422 or attempt >= GITHUB_REF_UPDATE_ATTEMPTS:
+                raise
+            logger.debug(
+                "Branch moved while committing, retrying",
+                repo_name=repo.full_name,
+                attempt=attempt,
+            )
+            attempt += 1
+
+
+def _blob_fingerprint(repo: Repository, sha: str) -> str:
+    fingerprint = blob_fingerprints.get(sha)
+    if fingerprint is None:
+        with timed("github_get_blob"):
+            blob = repo.get_git_blob(sha)
+        content = base64.b64decode(blob.content).decode()
+        fingerprint = blob_fingerprints.set(sha, lookml_fingerprint(content))
+    return fingerprint
+
+
+def _existing_blobs(repo: Repository) -> Dict[str, str]:
+    """Path -> blob sha for every file on the default branch, in one tree read."""
+    with timed("github_get_branch"):
+        head = repo.get_branch(repo.default_branch).commit.commit
+    with timed("github_get_tree"):
+        tree = repo.get_git_tree(head.tree.sha, recursive=True)
+    return {
+        element.path: element.sha for element in tree.tree if element.type == "blob"
+    }
+
+
+def _unchanged_files(
+    repo: Repository, files: Dict[str, str], existing: Dict[str, str]
+) -> Set[str]:
+    """Paths in `files` whose blob in `existing` has the same LookML.
+
+    Blobs not seen before are fetched concurrently and their fingerprints kept
+    for the next run.
+    """
+    candidates = {path: existing[path] for path in files if path in existing}
+    if not candidates:
+        return set()
+    with ThreadPoolExecutor(
+        max_workers=min(GITHUB_BLOB_FETCH_WORKERS, len(candidates))
+    ) as executor:
+        fingerprints = dict(
+            zip(
+                candidates,
+                executor.map(
+                    lambda sha: _blob_fingerprint(repo, sha), candidates.values()
+                ),
+            )
+        )
+    return {
+        path
+        for path, fingerprint in fingerprints.items()
+        if fingerprint == lookml_fingerprint(files[path])
+    }
+
+
+def _get_contents(repo: Repository, path: str):
+    with timed("github_get_contents"):
+        return repo.get_contents(path)
+
+
+def _create_file(repo: Repository, path: str, message: str, content: str) -> None:
+    with timed("github_create_file"):
+        repo.create_file(path=path, message=message, content=content)
+
+
+def _same_lookml(contents: ContentFile, lookml: str) -> bool:
+    try:
+        existing = contents.decoded_content.decode()
+    except Exception:
+        return False
+    return lookml_fingerprint(existing) == lookml_fingerprint(lookml)
+
+
+def _blend_unchanged(repo: Repository, filename: str, lookml: str) -> bool:
+    try:
+        contents = _get_contents(repo, filename)
+    except Exception:
+        return False
+    if isinstance(contents, list):
+        return False
+    if _same_lookml(contents, lookml):
+        logger.debug("Blend file unchanged", repo_name=repo.full_name, filename=filename)
+        return True
+    return False
+
+
+def _write_with_git_data_api(
+    repo: Repository,
+    *,
+    lookml: str,
+    uuid: str,
+    lookml_model: str,
+    connection_name: str,
+    filename: str,
+    out: "Response",
+    known_paths: Set[str],
+    skip_unchanged: bool,
+) -> None:
+    if skip_unchanged and _blend_unchanged(repo, filename, lookml):
+        out.file.unchanged = True
+        out.file.success = True
+        return
+    files = {filename: lookml}
+    if model_filename(lookml_model) not in known_paths:
+        try:
+            _get_contents(repo, model_filename(lookml_model))
+        except Exception:
+            logger.debug("Creating model file", repo_name=repo.full_name)
+            files[model_filename(lookml_model)] = model_file_content(connection_name)
+    out.file.commit_sha = commit_files(repo, files, f"Save blend {uuid}")
+    out.file.unchanged = out.file.commit_sha is None
+    # the model file lives in blends/{lookml_model}/, so both directories exist too
+    known_paths.update(
+        ["blends", f"blends/{lookml_model}", model_filename(lookml_model)]
+    )
+    out.file.success = True
+
+
+def _write_with_contents_api(
+    repo: Repository,
+    *,
+    lookml: str,
+    uuid: str,
+    lookml_model: str,
+    connection_name: str,
+    filename: str,
+    out: "Response",
+    known_paths: Set[str],
+    skip_unchanged: bool,
+) -> None:
+    project_name = out.deploy.project_name
+    repo_name = out.file.repo
+    if "blends" not in known_paths:
+        try:
+            _get_contents(repo, "blends")
+        except Exception:
+            logger.debug(f"Creating blends directory", project_name=project_name, repo_name=repo_name)
+            _create_file(repo, "blends/.gitkeep", "Create blends directory", "")
+        known_paths.add("blends")
+    if f"blends/{lookml_model}" not in known_paths:
+        try:
+            _get_contents(repo, f"blends/{lookml_model}")
+        except Exception:
+            logger.debug(
+                "Creating model directory", 
+                project_name=project_name, 
+                repo_name=repo_name, 
+                lookml_model=lookml_model
+            )
+            _create_file(
+                repo, f"blends/{lookml_model}/.gitkeep", "Create model directory", ""
+            )
+        known_paths.add(f"blends/{lookml_model}")
+    if model_filename(lookml_model) not in known_paths:
+        try:
+            _get_contents(repo, model_filename(lookml_model))
+        except Exception:
+            logger.debug("Creating model file")
+            _create_file(
+                repo,
+                model_filename(lookml_model),
+                "Create model file",
+                model_file_content(connection_name),
+            )
+        known_paths.add(model_filename(lookml_model))
+    try:
+        # Try to get existing file contents
+        contents = _get_contents(repo, filename)
+        if isinstance(contents, list):
+            contents = contents[0]
+        if skip_unchanged and _same_lookml(contents, lookml):
+            logger.debug("Blend file unchanged", repo_name=repo_name, filename=filename)
+            out.file.unchanged = True
+            out.file.success = True
+            return
+        with timed("github_update_file"):
+            repo.update_file(
+                path=filename,
+                message=f"Update blend {uuid}",
+                content=lookml,
+                sha=contents.sha,
+            )
+        out.file.success = True
+    except Exception:
+        logger.debug(
+            "Creating new blend file", 
+            project_name=project_name, 
+            repo_name=repo_name, 
+            lookml_model=lookml_model, 
+            uuid=uuid, filename=filename
+        )
+        # File doesn't exist, create new file
+        _create_file(repo, filename, f"Create blend {uuid}", lookml)
+        out.file.success = True
+
+
 def github_commit_and_deploy(
     *,
     lookml: str,
@@ -32,87 +348,163 @@ def github_commit_and_deploy(
     sdk_base_url: str,
     lookml_model: str,
     connection_name: str,
+    single_commit: bool | None = None,
+    force_deploy: bool = False,
     **kwargs,
 ):
     if not repo_name:
         raise ValueError("repo_name is required")
-    auth = Auth.Token(personal_access_token)
-
-    g = Github(auth=auth)
-    filename = f"blends/{lookml_model}/{uuid}.explore.lkml"
+    filename = blend_filename(lookml_model, uuid)
     out = Response(
         file=ResponseFile(success=False, filename=filename, repo=repo_name),
         deploy=ResponseDeploy(success=False, project_name=project_name),
     )
     # Get repository
-    repo = g.get_repo(repo_name)
-    try:
-        repo.get_contents("blends")
-    except Exception:
-        logger.debug(f"Creating blends directory", project_name=project_name, repo_name=repo_name)
-        repo.create_file("blends/.gitkeep", "Create blends directory", "")
+    repo = get_github_repo(personal_access_token, repo_name)
+    if single_commit if single_commit is not None else GITHUB_SINGLE_COMMIT:
+        write = _write_with_git_data_api
+    else:
+        write = _write_with_contents_api
+    scaffolding_key = (repo_name, lookml_model)
+    cached_paths = scaffolding_cache.get(scaffolding_key) or set()
+    known_paths = set(cached_paths)
     try:
-        repo.get_contents(f"blends/{lookml_model}")
+        write(
+            repo,
+            lookml=lookml,
+            uuid=uuid,
+            lookml_model=lookml_model,
+            connection_name=connection_name,
+            filename=filename,
+            out=out,
+            known_paths=known_paths,
+            skip_unchanged=not force_deploy,
+        )
     except Exception:
-        logger.debug(
-            "Creating model directory", 
-            project_name=project_name, 
-            repo_name=repo_name, 
-            lookml_model=lookml_model
+        # the token or repository may have changed since the handle was cached
+        invalidate_github_repo(personal_access_token, repo_name)
+        if not cached_paths:
+            raise
+        # the cached scaffolding may have been removed from the repo, check it again
+        logger.warning(
+            "Write failed with cached scaffolding, re-checking repository",
+            repo_name=repo_name,
+            lookml_model=lookml_model,
         )
-        repo.create_file(
-            f"blends/{lookml_model}/.gitkeep", "Create model directory", ""
+        scaffolding_cache.invalidate(scaffolding_key)
+        known_paths = set()
+        write(
+            repo,
+            lookml=lookml,
+            uuid=uuid,
+            lookml_model=lookml_model,
+            connection_name=connection_name,
+            filename=filename,
+            out=out,
+            known_paths=known_paths,
+            skip_unchanged=not force_deploy,
         )
-    try:
-        repo.get_contents(f"blends/{lookml_model}/{lookml_model}.model.lkml")
-    except Exception:
-        logger.debug("Creating model file")
-        repo.create_file(
-            f"blends/{lookml_model}/{lookml_model}.model.lkml",
-            "Create model file",
-            f'connection: "{connection_name}"\ninclude: "*.explore.lkml"',
+    scaffolding_cache.set(scaffolding_key, known_paths)
+    if out.file.unchanged:
+        # nothing new was committed, so there is nothing for Looker to pull
+        logger.info(
+            "Blend unchanged, skipping commit and deploy",
+            repo_name=repo_name,
+            project_name=project_name,
+            filename=filename,
         )
+        out.deploy.success = True
+        out.deploy.skipped = True
+        return out
+    # Call deploy webhook if secret provided
+    if webhook_secret:
+        with timed("deploy"):
+            result = deploy_scheduler.deploy(
+                sdk_base_url=sdk_base_url,
+                project_name=project_name,
+                webhook_secret=webhook_secret,
+            )
+        out.deploy.success = result.success
+        out.deploy.error = result.error
+        out.deploy.coalesced = result.coalesced
+        out.deploy.attempts = result.attempts
+        out.deploy.latency_ms = result.latency_ms
+    return out
+
+
+def github_batch_commit_and_deploy(
+    *,
+    blends: List[BatchBlend],
+    repo_name: str,
+    personal_access_token: str,
+    webhook_secret: str | None,
+    project_name: str,
+    sdk_base_url: str,
+) -> ResponseBatch:
+    """Commits every blend of one repo in a single commit and deploys the project once."""
+    if not repo_name:
+        raise ValueError("repo_name is required")
+    out = ResponseBatch(
+        success=False,
+        repo=repo_name,
+        filenames=[blend_filename(blend.lookml_model, blend.uuid) for blend in blends],
+        deploy=ResponseDeploy(success=False, project_name=project_name),
+    )
+    repo = get_github_repo(personal_access_token, repo_name)
+
+    model_connections = {blend.lookml_model: blend.connection_name for blend in blends}
     try:
-        # Try to get existing file contents
-        contents = repo.get_contents(filename)
-        if isinstance(contents, list):
-            contents = contents[0]
-        repo.update_file(
-            path=filename,
-            message=f"Update blend {uuid}",
-            content=lookml,
-            sha=contents.sha,
-        )
-        out.file.success = True
+        existing = _existing_blobs(repo)
+        blend_files = {
+            filename: blend.lookml for blend, filename in zip(blends, out.filenames)
+        }
+        unchanged = _unchanged_files(repo, blend_files, existing)
+        out.unchanged_filenames = [
+            filename for filename in out.filenames if filename in unchanged
+        ]
+        files = {
+            filename: lookml
+            for filename, lookml in blend_files.items()
+            if filename not in unchanged
+        }
+        for lookml_model, connection_name in model_connections.items():
+            if model_filename(lookml_model) in existing:
+                continue
+            logger.debug("Creating model file", repo_name=repo_name, lookml_model=lookml_model)
+            files[model_filename(lookml_model)] = model_file_content(connection_name)
+        if len(out.unchanged_filenames) < len(blends):
+            out.commit_sha = commit_files(repo, files, f"Save {len(blends)} blends")
     except Exception:
-        logger.debug(
-            "Creating new blend file", 
-            project_name=project_name, 
-            repo_name=repo_name, 
-            lookml_model=lookml_model, 
-            uuid=uuid, filename=filename
+        invalidate_github_repo(personal_access_token, repo_name)
+        raise
+    out.success = True
+    for lookml_model in model_connections:
+        scaffolding_cache.set(
+            (repo_name, lookml_model),
+            {"blends", f"blends/{lookml_model}", model_filename(lookml_model)},
         )
-        # File doesn't exist, create new file
-        repo.create_file(path=filename, message=f"Create blend {uuid}", content=lookml)
-        out.file.success = True
-    # Call deploy webhook if secret provided
+    if out.commit_sha is None:
+        logger.info(
+            "Blends unchanged, skipping commit and deploy",
+            repo_name=repo_name,
+            project_name=project_name,
+            number_of_blends=len(blends),
+        )
+        out.unchanged_filenames = list(out.filenames)
+        out.deploy.success = True
+        out.deploy.skipped = True
+        return out
+
     if webhook_secret:
-        logger.debug("Calling deploy webhook")
-        url = f"{sdk_base_url}/webhooks/projects/{project_name}/deploy"
-        try:
-            response = requests.post(
-                url,
-                headers={
-                    "X-Looker-Deploy-Secret": webhook_secret,
-                    "Content-Type": "application/json",
-                },
+        with timed("deploy"):
+            result = deploy_scheduler.deploy(
+                sdk_base_url=sdk_base_url,
+                project_name=project_name,
+                webhook_secret=webhook_secret,
             )
-            if response and response.status_code != 200:
-                logger.error("Deploy webhook failed", status_code=response.status_code, response=response.text)
-                out.deploy.error = response.text
-            else:
-                out.deploy.success = True
-        except Exception as e:
-            logger.error("Error calling deploy webhook", error=str(e))
-            out.deploy.error = str(e)
+        out.deploy.success = result.success
+        out.deploy.error = result.error
+        out.deploy.coalesced = result.coalesced
+        out.deploy.attempts = result.attempts
+        out.deploy.latency_ms = result.latency_ms
     return out
@@ -0,0 +1,93 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
+
+from looker_sdk.sdk.api40.methods import Looker40SDK
+from structlog import get_logger
+
+from .cache import TTLCache
+
+logger = get_logger()
+
+GROUP_NAMES_TTL_SECONDS = float(os.environ.get("GROUP_NAMES_TTL_SECONDS", "300"))
+GROUP_NAMES_MAX_HOSTS = int(os.environ.get("GROUP_NAMES_MAX_HOSTS", "32"))
+# ids per search_groups call, keeping the query string well under URL limits
+GROUP_SEARCH_CHUNK_SIZE = int(os.environ.get("GROUP_SEARCH_CHUNK_SIZE", "100"))
+GROUP_SEARCH_MAX_WORKERS = int(os.environ.get("GROUP_SEARCH_MAX_WORKERS", "8"))
+
+
+class HostGroupNames:
+    """Group id -> name for one Looker host; None marks ids Looker did not return."""
+
+    def __init__(self):
+        self.names: Dict[str, str | None] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, group_ids: Iterable[str]) -> Dict[str, str | None]:
+        with self._lock:
+            return {
+                group_id: self.names[group_id]
+                for group_id in group_ids
+                if group_id in self.names
+            }
+
+    def update(self, names: Dict[str, str | None]) -> None:
+        with self._lock:
+            self.names.update(names)
+
+
+# the whole map for a host expires together, so renames show up within the TTL
+group_names_cache: TTLCache[str, HostGroupNames] = TTLCache(
+    name="group_names",
+    max_size=GROUP_NAMES_MAX_HOSTS,
+    ttl=GROUP_NAMES_TTL_SECONDS,
+)
+
+
+def _host_group_names(sdk_base_url: str) -> HostGroupNames:
+    return group_names_cache.get_or_create(sdk_base_url.rstrip("/"), HostGroupNames)
+
+
+def remember_group_names(sdk_base_url: str, names: Dict[str, str | None]) -> None:
+    """Adds names learned elsewhere, e.g. while reading role groups."""
+    _host_group_names(sdk_base_url).update(names)
+
+
+def resolve_group_names(
+    sdk: Looker40SDK, sdk_base_url: str, group_ids: Iterable[str]
+) -> Dict[str, str | None]:
+    host = _host_group_names(sdk_base_url)
+    group_ids = set(group_ids)
+    resolved = host.lookup(group_ids)
+    missing = sorted(group_ids - resolved.keys())
+    if not missing:
+        return resolved
+
+    def search_groups(chunk: List[str]) -> Dict[str, str | None]:
+        names: Dict[str, str | None] = dict.fromkeys(chunk)
+        for group in sdk.search_groups(
+            id=",".join(chunk), fields="id,name", limit=len(chunk)
+        ):
+            names[group.id] = group.name
+        return names
+
+    chunks = [
+        missing[i : i + GROUP_SEARCH_CHUNK_SIZE]
+        for i in range(0, len(missing), GROUP_SEARCH_CHUNK_SIZE)
+    ]
+    logger.debug(
+        "Resolving group names",
+        sdk_base_url=sdk_base_url,
+        hits=len(resolved),
+        misses=len(missing),
+        chunks=len(chunks),
+    )
+    fetched: Dict[str, str | None] = {}
+    max_workers = min(GROUP_SEARCH_MAX_WORKERS, len(chunks))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for names in executor.map(search_groups, chunks):
+            fetched.update(names)
+    host.update(fetched)
+    resolved.update(fetched)
+    return resolved
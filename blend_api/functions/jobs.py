@@ -0,0 +1,117 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Literal
+
+from pydantic import BaseModel, Field
+from structlog import get_logger
+
+from .cache import TTLCache
+
+logger = get_logger()
+
+JOBS_MAX_WORKERS = int(os.environ.get("JOBS_MAX_WORKERS", "4"))
+JOBS_MAX_SIZE = int(os.environ.get("JOBS_MAX_SIZE", "1000"))
+JOBS_TTL_SECONDS = float(os.environ.get("JOBS_TTL_SECONDS", "3600"))
+
+TJobStatus = Literal["queued", "running", "succeeded", "failed"]
+
+
+class Job(BaseModel):
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+    kind: str
+    owner: str | None = Field(default=None, exclude=True)
+    status: TJobStatus = "queued"
+    stage: str | None = None
+    result: Dict[str, Any] | None = None
+    error: str | None = None
+    created_at: float = Field(default_factory=time.time)
+    updated_at: float = Field(default_factory=time.time)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+
+TJobProgress = Callable[[str], None]
+
+
+def job_owner(*credentials: str) -> str:
+    """Owner key for a job: a hash of credentials the poller must send again."""
+    return hashlib.sha256("\0".join(credentials).encode()).hexdigest()
+
+
+class JobQueue:
+    """In-process job queue; jobs are kept in a bounded TTL store so they can be polled.
+
+    Jobs run after the HTTP response is sent. Cloud Functions throttles CPU once
+    a request has been answered, so this needs the service's CPU set to "always
+    allocated"; otherwise queued jobs stall until the next request arrives.
+    """
+
+    def __init__(self, *, max_workers: int, max_size: int, ttl: float):
+        self.jobs: TTLCache[str, Job] = TTLCache(
+            name="jobs", max_size=max_size, ttl=ttl
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="blend-job"
+        )
+        self._lock = threading.Lock()
+
+    def _update(self, job: Job, **changes) -> None:
+        with self._lock:
+            for key, value in changes.items():
+                setattr(job, key, value)
+            job.updated_at = time.time()
+
+    def submit(
+        self,
+        kind: str,
+        fn: Callable[[TJobProgress], Dict[str, Any]],
+        *,
+        owner: str | None = None,
+    ) -> Job:
+        """Queues `fn(progress)`; its return value becomes the job result.
+
+        `progress(stage)` records what the job is doing for pollers. An exception
+        fails the job with its message as the error.
+        """
+        job = Job(kind=kind, owner=owner)
+        job_id = job.id
+        self.jobs.set(job_id, job)
+
+        def run():
+            self._update(job, status="running")
+            try:
+                result = fn(lambda stage: self._update(job, stage=stage))
+                self._update(job, status="succeeded", result=result, stage="done")
+            except Exception as e:
+                logger.error(
+                    "Error running job", job_id=job_id, kind=kind, error=str(e)
+                )
+                self._update(job, status="failed", error=str(e))
+            logger.info(
+                "Job finished",
+                job_id=job_id,
+                kind=kind,
+                status=job.status,
+                duration=round(job.updated_at - job.created_at, 3),
+            )
+
+        self._executor.submit(run)
+        return job
+
+    def get(self, job_id: str, *, owner: str | None = None) -> Job | None:
+        job = self.jobs.get(job_id)
+        if job is None or not hmac.compare_digest(job.owner or "", owner or ""):
+            return None
+        return job
+
+
+job_queue = JobQueue(
+    max_workers=JOBS_MAX_WORKERS, max_size=JOBS_MAX_SIZE, ttl=JOBS_TTL_SECONDS
+)
@@ -0,0 +1,296 @@
+import os
+import threading
+import time
+from typing import Dict, FrozenSet, Iterable, Set, cast
+
+from looker_sdk.sdk.api40.methods import Looker40SDK
+from structlog import get_logger
+
+from .cache import TTLCache
+from .role_topology import (
+    GroupId,
+    ModelName,
+    RoleId,
+    RoleTopology,
+    fetch_role_groups,
+)
+
+logger = get_logger()
+
+# After MODEL_INDEX_REFRESH_SECONDS the index is rebuilt in the background while
+# callers keep reading the previous one; after ROLE_TOPOLOGY_TTL_SECONDS without
+# a refresh it is considered too stale to serve and is rebuilt inline. Refreshes
+# reuse the groups of unchanged roles, but re-read every role's groups once the
+# last full read is ROLE_TOPOLOGY_TTL_SECONDS old, so removed groups lose access.
+MODEL_INDEX_REFRESH_SECONDS = float(os.environ.get("MODEL_INDEX_REFRESH_SECONDS", "60"))
+# an access grant with no matching groups forces a refresh, but never of an index
+# younger than this, so repeated failing saves don't each re-read the host's roles
+MODEL_INDEX_MIN_REFRESH_SECONDS = float(
+    os.environ.get("MODEL_INDEX_MIN_REFRESH_SECONDS", "10")
+)
+ROLE_TOPOLOGY_TTL_SECONDS = float(os.environ.get("ROLE_TOPOLOGY_TTL_SECONDS", "300"))
+ROLE_TOPOLOGY_MAX_HOSTS = int(os.environ.get("ROLE_TOPOLOGY_MAX_HOSTS", "32"))
+
+
+class ModelGroupIndex:
+    """Maps LookML models on a Looker host to the group ids that can reach them.
+
+    Built from one all_roles call. A role's groups are fetched the first time a
+    model it grants is looked up, and each model's group set is kept once
+    computed. A refresh re-reads all_roles and keeps everything learned from
+    roles whose model set did not change, so only new and changed roles are
+    fetched again. Changes to a role's groups alone show up at the next full
+    refresh, which re-reads the groups of every role fetched so far;
+    `full_built_at` is when the groups were last read that way.
+    """
+
+    def __init__(
+        self,
+        sdk_base_url: str,
+        role_models: Dict[RoleId, FrozenSet[ModelName]],
+        role_groups: Dict[RoleId, FrozenSet[GroupId]] | None = None,
+        model_groups: Dict[ModelName, FrozenSet[GroupId]] | None = None,
+        *,
+        full_built_at: float | None = None,
+    ):
+        self.sdk_base_url = sdk_base_url
+        self.role_models = role_models
+        self.role_groups = role_groups or {}
+        self.model_groups = model_groups or {}
+        model_roles: Dict[ModelName, Set[RoleId]] = {}
+        for role_id, models in role_models.items():
+            for model_name in models:
+                model_roles.setdefault(model_name, set()).add(role_id)
+        self.model_roles = {
+            model_name: frozenset(role_ids)
+            for model_name, role_ids in model_roles.items()
+        }
+        self.created_at = time.monotonic()
+        self.full_built_at = (
+            full_built_at if full_built_at is not None else self.created_at
+        )
+        self._lock = threading.Lock()
+        # held while fetching, so concurrent lookups don't fetch a role twice
+        self._fetch_lock = threading.Lock()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+    def groups_for_model(self, model_name: str) -> FrozenSet[GroupId]:
+        """The groups of a model already looked up through groups_for_models."""
+        with self._lock:
+            return self.model_groups.get(cast(ModelName, model_name), frozenset())
+
+    def _missing_models(self, model_names: Set[ModelName]) -> Set[ModelName]:
+        with self._lock:
+            return model_names - self.model_groups.keys()
+
+    def groups_for_models(
+        self, sdk: Looker40SDK, models: Iterable[str]
+    ) -> Set[GroupId]:
+        """Group ids that can reach every one of `models`."""
+        model_names = cast(Set[ModelName], set(models))
+        if not model_names:
+            return set()
+        if self._missing_models(model_names):
+            with self._fetch_lock:
+                missing_models = self._missing_models(model_names)
+                role_ids = set().union(
+                    *(self.model_roles.get(m, frozenset()) for m in missing_models)
+                )
+                with self._lock:
+                    missing_roles = role_ids - self.role_groups.keys()
+                fetched = fetch_role_groups(sdk, self.sdk_base_url, missing_roles)
+                with self._lock:
+                    for role_id, groups in fetched.items():
+                        self.role_groups[role_id] = frozenset(groups)
+                    for model_name in missing_models:
+                        self.model_groups[model_name] = frozenset().union(
+                            *(
+                                self.role_groups[role_id]
+                                for role_id in self.model_roles.get(
+                                    model_name, frozenset()
+                                )
+                            )
+                        )
+        group_sets = sorted(
+            (self.groups_for_model(model_name) for model_name in model_names), key=len
+        )
+        return set(group_sets[0]).intersection(*group_sets[1:])
+
+    @classmethod
+    def build(
+        cls,
+        sdk: Looker40SDK,
+        sdk_base_url: str,
+        previous: "ModelGroupIndex | None" = None,
+        *,
+        recheck_models: Iterable[str] = (),
+    ) -> "ModelGroupIndex":
+        """Builds the index, reusing `previous` for roles that did not change.
+
+        Roles granting any of `recheck_models` have their groups fetched again
+        even when their model set is unchanged. Once `previous` was last fully
+        read ROLE_TOPOLOGY_TTL_SECONDS ago, every role it had fetched is
+        fetched again and nothing else is carried over.
+        """
+        topology = RoleTopology.fetch(sdk, sdk_base_url)
+        role_models = {
+            role_id: frozenset(models)
+            for role_id, models in topology.role_models.items()
+        }
+        if previous is None:
+            logger.info(
+                "Built model group index",
+                sdk_base_url=sdk_base_url,
+                number_of_roles=len(role_models),
+            )
+            return cls(sdk_base_url, role_models)
+
+        if time.monotonic() - previous.full_built_at >= ROLE_TOPOLOGY_TTL_SECONDS:
+            with previous._lock:
+                role_ids = previous.role_groups.keys() & role_models.keys()
+            fetched = fetch_role_groups(sdk, sdk_base_url, role_ids)
+            logger.info(
+                "Rebuilt model group index",
+                sdk_base_url=sdk_base_url,
+                number_of_roles=len(role_models),
+                refetched_roles=len(fetched),
+            )
+            return cls(
+                sdk_base_url,
+                role_models,
+                {role_id: frozenset(groups) for role_id, groups in fetched.items()},
+            )
+
+        # roles that are new, removed or have a different model set
+        recheck_models = set(recheck_models)
+        changed_roles = {
+            role_id
+            for role_id in role_models.keys() | previous.role_models.keys()
+            if role_models.get(role_id) != previous.role_models.get(role_id)
+            or role_models.get(role_id, frozenset()) & recheck_models
+        }
+        affected_models = set().union(
+            *(role_models.get(role_id, frozenset()) for role_id in changed_roles),
+            *(
+                previous.role_models.get(role_id, frozenset())
+                for role_id in changed_roles
+            ),
+        )
+        with previous._lock:
+            role_groups = {
+                role_id: groups
+                for role_id, groups in previous.role_groups.items()
+                if role_id in role_models and role_id not in changed_roles
+            }
+            model_groups = {
+                model_name: groups
+                for model_name, groups in previous.model_groups.items()
+                if model_name not in affected_models
+            }
+        logger.info(
+            "Refreshed model group index",
+            sdk_base_url=sdk_base_url,
+            number_of_roles=len(role_models),
+            changed_roles=len(changed_roles),
+            changed_models=sorted(affected_models),
+        )
+        return cls(
+            sdk_base_url,
+            role_models,
+            role_groups,
+            model_groups,
+            full_built_at=previous.full_built_at,
+        )
+
+
+model_group_index_cache: TTLCache[str, ModelGroupIndex] = TTLCache(
+    name="model_group_index",
+    max_size=ROLE_TOPOLOGY_MAX_HOSTS,
+    ttl=ROLE_TOPOLOGY_TTL_SECONDS,
+)
+_refreshing: Set[str] = set()
+_refreshing_lock = threading.Lock()
+# one refresh per host at a time; waiting callers reuse its result
+_refresh_locks: Dict[str, threading.Lock] = {}
+
+
+def _host_key(sdk_base_url: str) -> str:
+    return sdk_base_url.rstrip("/")
+
+
+def refresh_model_group_index(
+    sdk: Looker40SDK,
+    sdk_base_url: str,
+    *,
+    min_age: float = 0,
+    recheck_models: Iterable[str] = (),
+) -> ModelGroupIndex:
+    """Rebuilds the index for a host, updating the current one incrementally.
+
+    Returns the current index instead when it is younger than `min_age`, which
+    includes one just built by a concurrent refresh this call waited for.
+    """
+    key = _host_key(sdk_base_url)
+    with _refreshing_lock:
+        lock = _refresh_locks.setdefault(key, threading.Lock())
+    with lock:
+        previous = model_group_index_cache.get(key)
+        if previous is not None and previous.age < min_age:
+            logger.debug(
+                "Model group index too recent to refresh",
+                sdk_base_url=sdk_base_url,
+                age=round(previous.age, 3),
+            )
+            return previous
+        index = ModelGroupIndex.build(
+            sdk, sdk_base_url, previous, recheck_models=recheck_models
+        )
+        return model_group_index_cache.set(key, index)
+
+
+def _refresh_in_background(sdk: Looker40SDK, sdk_base_url: str) -> None:
+    key = _host_key(sdk_base_url)
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            refresh_model_group_index(sdk, sdk_base_url)
+        except Exception as e:
+            logger.error(
+                "Error refreshing model group index",
+                sdk_base_url=sdk_base_url,
+                error=str(e),
+            )
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=run, name=f"model-index-{key}", daemon=True).start()
+
+
+def get_model_group_index(sdk: Looker40SDK, sdk_base_url: str) -> ModelGroupIndex:
+    index = model_group_index_cache.get_or_create(
+        _host_key(sdk_base_url), lambda: ModelGroupIndex.build(sdk, sdk_base_url)
+    )
+    logger.debug(
+        "Using model group index",
+        sdk_base_url=sdk_base_url,
+        age=round(index.age, 3),
+    )
+    if index.age >= MODEL_INDEX_REFRESH_SECONDS:
+        _refresh_in_background(sdk, sdk_base_url)
+    return index
+
+
+def invalidate_model_group_index(sdk_base_url: str | None = None) -> None:
+    """Drops the index for one host, or for every host when none is given."""
+    logger.info("Invalidating model group index", sdk_base_url=sdk_base_url)
+    model_group_index_cache.invalidate(
+        _host_key(sdk_base_url) if sdk_base_url is not None else None
+    )
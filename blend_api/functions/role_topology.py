@@ -0,0 +1,77 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Set, cast
+
+from looker_sdk.sdk.api40.methods import Looker40SDK
+from structlog import get_logger
+
+from .group_names import remember_group_names
+from .timing import count
+
+logger = get_logger()
+
+ROLE_GROUPS_MAX_WORKERS = int(os.environ.get("ROLE_GROUPS_MAX_WORKERS", "8"))
+
+
+class ModelName(str):
+    pass
+
+
+class RoleId(str):
+    pass
+
+
+class GroupId(str):
+    pass
+
+
+class RoleTopology:
+    """Snapshot of a Looker host's role -> model_set map, read with one all_roles call.
+
+    Role groups are not part of the snapshot; fetch_role_groups reads them for
+    the roles a caller actually needs.
+    """
+
+    def __init__(self, sdk_base_url: str, role_models: Dict[RoleId, Set[ModelName]]):
+        self.sdk_base_url = sdk_base_url
+        self.role_models = role_models
+
+    @classmethod
+    def fetch(cls, sdk: Looker40SDK, sdk_base_url: str) -> "RoleTopology":
+        role_models: Dict[RoleId, Set[ModelName]] = {}
+        count("looker_sdk_calls")
+        for role in sdk.all_roles(fields="id,model_set"):
+            if role.model_set and role.model_set.models:
+                role_models[cast(RoleId, role.id)] = cast(
+                    Set[ModelName], set(role.model_set.models)
+                )
+        logger.info(
+            "Fetched role topology",
+            sdk_base_url=sdk_base_url,
+            number_of_roles=len(role_models),
+        )
+        return cls(sdk_base_url, role_models)
+
+
+def fetch_role_groups(
+    sdk: Looker40SDK, sdk_base_url: str, role_ids: Iterable[RoleId]
+) -> Dict[RoleId, Set[GroupId]]:
+    """Group ids of each role, looked up concurrently."""
+    role_ids = list(role_ids)
+    if not role_ids:
+        return {}
+
+    def fetch(role_id: RoleId) -> Set[GroupId]:
+        groups = sdk.role_groups(role_id, fields="id,name")
+        # names come for free here and save the user attribute sync a lookup
+        remember_group_names(sdk_base_url, {group.id: group.name for group in groups})
+        return cast(Set[GroupId], {group.id for group in groups})
+
+    logger.debug(
+        "Fetching role groups", sdk_base_url=sdk_base_url, number_of_roles=len(role_ids)
+    )
+    # counted here: the worker threads don't see the request's timer
+    count("looker_sdk_calls", len(role_ids))
+    max_workers = min(ROLE_GROUPS_MAX_WORKERS, len(role_ids))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(role_ids, executor.map(fetch, role_ids)))
@@ -0,0 +1,280 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, Literal, Protocol, Set, Tuple
+
+from pydantic import BaseModel, Field
+from structlog import get_logger
+
+logger = get_logger()
+
+# the function's /tmp survives between invocations on a warm instance; point this
+# at a mounted volume to resume across instances
+SYNC_CHECKPOINT_PATH = os.environ.get(
+    "SYNC_CHECKPOINT_PATH",
+    os.path.join(tempfile.gettempdir(), "blend_api_sync.sqlite3"),
+)
+SYNC_CHECKPOINT_TTL_SECONDS = float(
+    os.environ.get("SYNC_CHECKPOINT_TTL_SECONDS", str(7 * 24 * 3600))
+)
+# expired jobs are pruned by the first save after this long since the last prune
+SYNC_CHECKPOINT_PRUNE_INTERVAL_SECONDS = float(
+    os.environ.get("SYNC_CHECKPOINT_PRUNE_INTERVAL_SECONDS", "3600")
+)
+
+TSyncStatus = Literal["running", "completed"]
+
+
+class SyncCheckpoint(BaseModel):
+    job_id: str
+    sdk_base_url: str
+    user_attribute: str
+    status: TSyncStatus = "running"
+    number_of_users: int = 0
+    number_of_users_updated: int = 0
+    number_of_users_unchanged: int = 0
+    group_names: Dict[str, str | None] = Field(default_factory=dict)
+    processed_user_ids: Set[str] = Field(default_factory=set)
+    updated_at: float = Field(default_factory=time.time)
+
+
+class MembershipSnapshot(BaseModel):
+    """Group memberships and group names as of the last complete sync."""
+
+    # user id -> group ids joined by commas, in the order Looker lists them
+    memberships: Dict[str, str] = Field(default_factory=dict)
+    group_names: Dict[str, str | None] = Field(default_factory=dict)
+
+
+class SyncCheckpointStore(Protocol):
+    def load(self, job_id: str) -> SyncCheckpoint | None: ...
+
+    def save(
+        self, checkpoint: SyncCheckpoint, *, processed_user_ids: Iterable[str] = ()
+    ) -> None:
+        """Persists the checkpoint's progress, adding `processed_user_ids`."""
+        ...
+
+    def save_groups(self, job_id: str, group_names: Dict[str, str | None]) -> None: ...
+
+    def delete(self, job_id: str) -> None: ...
+
+    def load_snapshot(self, scope: str) -> MembershipSnapshot: ...
+
+    def save_memberships(
+        self, scope: str, run_id: str, memberships: Iterable[Tuple[str, str]]
+    ) -> None:
+        """Records (user id, signature) pairs seen by run `run_id`."""
+        ...
+
+    def finish_snapshot(
+        self, scope: str, run_id: str, group_names: Dict[str, str | None]
+    ) -> None:
+        """Drops users not seen by `run_id` and replaces the group names."""
+        ...
+
+
+class SqliteSyncCheckpointStore:
+    """Checkpoints in a local SQLite file; safe to share between threads.
+
+    A completed job keeps only its counts; its per-user and per-group rows are
+    dropped when it completes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        ttl: float = SYNC_CHECKPOINT_TTL_SECONDS,
+        prune_interval: float = SYNC_CHECKPOINT_PRUNE_INTERVAL_SECONDS,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self._connection: sqlite3.Connection | None = None
+        self._pruned_at = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS sync_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    checkpoint TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS sync_users (
+                    job_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    PRIMARY KEY (job_id, user_id)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS sync_groups (
+                    job_id TEXT NOT NULL,
+                    group_id TEXT NOT NULL,
+                    name TEXT,
+                    PRIMARY KEY (job_id, group_id)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS snapshot_memberships (
+                    scope TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    signature TEXT NOT NULL,
+                    run_id TEXT NOT NULL,
+                    PRIMARY KEY (scope, user_id)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS snapshot_groups (
+                    scope TEXT NOT NULL,
+                    group_id TEXT NOT NULL,
+                    name TEXT,
+                    PRIMARY KEY (scope, group_id)
+                ) WITHOUT ROWID;
+                """
+            )
+            self._connection = connection
+        return self._connection
+
+    def _prune(self, connection: sqlite3.Connection) -> None:
+        now = time.monotonic()
+        if self._pruned_at and now - self._pruned_at < self.prune_interval:
+            return
+        self._pruned_at = now
+        expired = [
+            job_id
+            for (job_id,) in connection.execute(
+                "SELECT job_id FROM sync_jobs WHERE updated_at < ?",
+                (time.time() - self.ttl,),
+            )
+        ]
+        for job_id in expired:
+            self._delete(connection, job_id)
+        if expired:
+            logger.info("Pruned sync checkpoints", number_of_jobs=len(expired))
+
+    @staticmethod
+    def _delete(
+        connection: sqlite3.Connection,
+        job_id: str,
+        tables: Tuple[str, ...] = ("sync_jobs", "sync_users", "sync_groups"),
+    ) -> None:
+        with connection:
+            for table in tables:
+                connection.execute(f"DELETE FROM {table} WHERE job_id = ?", (job_id,))
+
+    def load(self, job_id: str) -> SyncCheckpoint | None:
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT checkpoint FROM sync_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            checkpoint = SyncCheckpoint.model_validate_json(row[0])
+            checkpoint.processed_user_ids = {
+                user_id
+                for (user_id,) in connection.execute(
+                    "SELECT user_id FROM sync_users WHERE job_id = ?", (job_id,)
+                )
+            }
+            checkpoint.group_names = dict(
+                connection.execute(
+                    "SELECT group_id, name FROM sync_groups WHERE job_id = ?",
+                    (job_id,),
+                ).fetchall()
+            )
+        return checkpoint
+
+    def save(
+        self, checkpoint: SyncCheckpoint, *, processed_user_ids: Iterable[str] = ()
+    ) -> None:
+        checkpoint.updated_at = time.time()
+        data = checkpoint.model_dump_json(exclude={"group_names", "processed_user_ids"})
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO sync_jobs VALUES (?, ?, ?)",
+                    (checkpoint.job_id, data, checkpoint.updated_at),
+                )
+                connection.executemany(
+                    "INSERT OR IGNORE INTO sync_users VALUES (?, ?)",
+                    ((checkpoint.job_id, user_id) for user_id in processed_user_ids),
+                )
+            if checkpoint.status == "completed":
+                # nothing resumes a completed job; only its counts are read back
+                self._delete(
+                    connection, checkpoint.job_id, ("sync_users", "sync_groups")
+                )
+            self._prune(connection)
+
+    def save_groups(self, job_id: str, group_names: Dict[str, str | None]) -> None:
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO sync_groups VALUES (?, ?, ?)",
+                    (
+                        (job_id, group_id, name)
+                        for group_id, name in group_names.items()
+                    ),
+                )
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._delete(self._connect(), job_id)
+
+    def load_snapshot(self, scope: str) -> MembershipSnapshot:
+        with self._lock:
+            connection = self._connect()
+            return MembershipSnapshot(
+                memberships=dict(
+                    connection.execute(
+                        "SELECT user_id, signature FROM snapshot_memberships"
+                        " WHERE scope = ?",
+                        (scope,),
+                    ).fetchall()
+                ),
+                group_names=dict(
+                    connection.execute(
+                        "SELECT group_id, name FROM snapshot_groups WHERE scope = ?",
+                        (scope,),
+                    ).fetchall()
+                ),
+            )
+
+    def save_memberships(
+        self, scope: str, run_id: str, memberships: Iterable[Tuple[str, str]]
+    ) -> None:
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO snapshot_memberships VALUES (?, ?, ?, ?)",
+                    (
+                        (scope, user_id, signature, run_id)
+                        for user_id, signature in memberships
+                    ),
+                )
+
+    def finish_snapshot(
+        self, scope: str, run_id: str, group_names: Dict[str, str | None]
+    ) -> None:
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "DELETE FROM snapshot_memberships WHERE scope = ? AND run_id != ?",
+                    (scope, run_id),
+                )
+                connection.execute(
+                    "DELETE FROM snapshot_groups WHERE scope = ?", (scope,)
+                )
+                connection.executemany(
+                    "INSERT INTO snapshot_groups VALUES (?, ?, ?)",
+                    ((scope, group_id, name) for group_id, name in group_names.items()),
+                )
+
+
+checkpoint_store: SyncCheckpointStore = SqliteSyncCheckpointStore(SYNC_CHECKPOINT_PATH)
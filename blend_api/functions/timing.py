@@ -0,0 +1,105 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator
+
+from structlog import get_logger
+
+logger = get_logger()
+
+
+class RequestTimer:
+    """Wall time and call counts per stage of one request; safe to share between threads."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started_at) * 1000
+            with self._lock:
+                self.durations[name] = self.durations.get(name, 0) + elapsed
+                self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, e.g. `headers;dur=0.1, github_get_contents;dur=80.2;desc="2 calls"`."""
+        with self._lock:
+            metrics = [
+                f'{name};dur={duration:.1f};desc="{self.calls[name]} calls"'
+                if self.calls[name] > 1
+                else f"{name};dur={duration:.1f}"
+                for name, duration in self.durations.items()
+            ]
+            metrics.extend(f'{name};desc="{n}"' for name, n in self.counters.items())
+        metrics.append(f"total;dur={self.total_ms:.1f}")
+        return ", ".join(metrics)
+
+    def log(self, event: str, **kwargs) -> None:
+        with self._lock:
+            stages = {
+                name: round(duration, 1) for name, duration in self.durations.items()
+            }
+            calls = {name: n for name, n in self.calls.items() if n > 1}
+            counters = dict(self.counters)
+        logger.info(
+            event,
+            total_ms=round(self.total_ms, 1),
+            stages=stages,
+            calls=calls,
+            **counters,
+            **kwargs,
+        )
+
+
+# the timer of the request being handled; unset outside main and in job workers
+_current_timer: ContextVar[RequestTimer | None] = ContextVar(
+    "request_timer", default=None
+)
+
+
+def current_timer() -> RequestTimer | None:
+    return _current_timer.get()
+
+
+@contextmanager
+def request_timer() -> Iterator[RequestTimer]:
+    timer = RequestTimer()
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Records the block as stage `name` of the current request, if there is one."""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+    else:
+        with timer.stage(name):
+            yield
+
+
+def count(name: str, n: int = 1) -> None:
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.count(name, n)
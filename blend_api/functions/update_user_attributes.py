@@ -1,14 +1,58 @@
-# Threaded user fetching with LIMIT=500 and 5 workers until <500 returned
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Literal, TypedDict, cast
+import os
+import random
+import time
+import uuid
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Sequence,
+    Tuple,
+    TypedDict,
+    cast,
+)
 
 from lkr import UserAttributeUpdater
 from looker_sdk.sdk.api40.methods import Looker40SDK
-from looker_sdk.sdk.api40.models import WriteUserAttributeWithValue
+from looker_sdk.sdk.api40.models import User, WriteUserAttributeWithValue
 from structlog import get_logger
 
+from .concurrency import AdaptiveConcurrency, looker_error_status
+from .deploy import RETRYABLE_STATUS_CODES
+from .group_names import resolve_group_names
+from .sync_checkpoints import MembershipSnapshot, SyncCheckpoint, checkpoint_store
+from .utils import get_sdk
+
 logger = get_logger()
 
+USER_PAGE_SIZE = int(os.environ.get("USER_PAGE_SIZE", "500"))
+USER_PAGE_PREFETCH = int(os.environ.get("USER_PAGE_PREFETCH", "5"))
+# concurrent attribute writes adapt between the min and max worker counts,
+# backing off when Looker rate limits or errors and growing while it keeps up
+USER_UPDATE_MIN_WORKERS = int(os.environ.get("USER_UPDATE_MIN_WORKERS", "2"))
+USER_UPDATE_INITIAL_WORKERS = int(os.environ.get("USER_UPDATE_INITIAL_WORKERS", "10"))
+USER_UPDATE_MAX_WORKERS = int(os.environ.get("USER_UPDATE_MAX_WORKERS", "50"))
+USER_UPDATE_TARGET_LATENCY_SECONDS = float(
+    os.environ.get("USER_UPDATE_TARGET_LATENCY_SECONDS", "2")
+)
+USER_UPDATE_MAX_ATTEMPTS = int(os.environ.get("USER_UPDATE_MAX_ATTEMPTS", "3"))
+USER_UPDATE_BACKOFF_BASE_SECONDS = float(
+    os.environ.get("USER_UPDATE_BACKOFF_BASE_SECONDS", "0.5")
+)
+USER_SYNC_CHECKPOINT_EVERY = int(os.environ.get("USER_SYNC_CHECKPOINT_EVERY", "500"))
+# 0 means no budget; otherwise keep it under the function timeout
+USER_SYNC_TIME_BUDGET_SECONDS = float(
+    os.environ.get("USER_SYNC_TIME_BUDGET_SECONDS", "0")
+)
+
 
 class UpdateUserAttributesSuccess(TypedDict):
     success: Literal[True]
@@ -35,22 +79,139 @@ def update_user_by_id(
         return dict(success=True)
     except Exception as e:
         logger.error("Error updating user", error=e)
+        status = looker_error_status(e)
         return dict(
             success=False,
             error=str(e),
             user_id=looker_user_id,
             user_attribute_id=user_attribute_id,
             value=value,
+            # rate limits, server errors and failures without an API response
+            retryable=status is None or status in RETRYABLE_STATUS_CODES,
         )
 
 
+class GroupSignatureValues:
+    """Attribute values memoized per distinct group membership.
+
+    Most users share one of a handful of group sets, so each set's value is
+    joined once and every user holding it references the same string. The
+    signature is the group ids in the order Looker lists them, which is also
+    the order their names are joined in.
+    """
+
+    def __init__(self, group_names: Dict[str, str | None]):
+        self.group_names = group_names
+        self._values: Dict[Tuple[str, ...], str] = {}
+
+    @staticmethod
+    def signature(group_ids: Sequence[str] | None) -> Tuple[str, ...]:
+        return tuple(group_ids or ())
+
+    def value_for(self, group_ids: Sequence[str] | None) -> str:
+        signature = self.signature(group_ids)
+        value = self._values.get(signature)
+        if value is None:
+            names = (self.group_names.get(group_id) for group_id in signature)
+            value = self._values[signature] = ",".join(
+                name for name in names if name is not None
+            )
+        return value
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+def get_user_value(
+    user_attribute_id: str,
+    looker_user_id: str,
+    sdk: Looker40SDK,
+) -> str | None:
+    """The value set on the user itself, or None when it is inherited or unset."""
+    values = sdk.user_attribute_user_values(
+        user_id=looker_user_id,
+        fields="value,source",
+        user_attribute_ids=[user_attribute_id],
+    )
+    for value in values or []:
+        if value.source == "user":
+            return value.value or ""
+    return None
+
+
+def iter_user_pages(
+    sdk: Looker40SDK, *, page_size: int, max_prefetch: int
+) -> Iterator[Tuple[int, List[User]]]:
+    """Yields (offset, page) for pages of active users as they arrive.
+
+    Prefetch depth starts at one request and doubles while pages come back full,
+    up to `max_prefetch`. Once a short page is seen no further offsets are
+    requested, so at most the in-flight requests overshoot the end of the list.
+    New requests are only issued when the caller asks for the next page.
+    """
+
+    def fetch_users(offset: int) -> List[User]:
+        return sdk.search_users(
+            fields="id,group_ids",
+            embed_user=False,
+            is_disabled=False,
+            limit=page_size,
+            offset=offset,
+            sorts="id",
+        )
+
+    with ThreadPoolExecutor(max_workers=max_prefetch) as executor:
+        in_flight: Dict[Future, int] = {}
+        next_offset = 0
+        depth = 1
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < depth:
+                in_flight[executor.submit(fetch_users, next_offset)] = next_offset
+                next_offset += page_size
+            if not in_flight:
+                return
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                offset = in_flight.pop(future)
+                page = future.result()
+                if len(page) < page_size:
+                    exhausted = True
+                else:
+                    depth = min(max_prefetch, depth * 2)
+                if page:
+                    yield offset, page
+
+
 def update_user_attributes(
     *,
     sdk_base_url: str,
     sdk_client_id: str,
     sdk_client_secret: str,
     user_attribute: str,
+    diff_only: bool = False,
+    incremental: bool = False,
+    verify: bool = False,
+    job_id: str | None = None,
 ):
+    """Sets the user attribute on every active user to their comma-joined group names.
+
+    Every complete run leaves a snapshot of each user's group ids and the group
+    names. With `incremental`, users whose groups and group names match that
+    snapshot are counted as unchanged without being written. With `diff_only`,
+    users whose computed value equals the value that snapshot says was last
+    written are not written, even when their groups changed.
+
+    With `verify`, nothing is written: each user's value is read from Looker and
+    users holding a different value are reported in `erroring_users`.
+
+    Progress is checkpointed under `job_id` (a new one is returned when omitted).
+    Calling again with the same job id pages through the users from the start
+    again, skipping users that were already written, so users that failed and
+    users who moved to an earlier page since the last call are still visited. When
+    USER_SYNC_TIME_BUDGET_SECONDS is set, the call stops taking new pages once
+    the budget is spent and returns `complete=False`.
+    """
     try:
         uau = UserAttributeUpdater(
             base_url=sdk_base_url,
@@ -60,7 +221,7 @@ def update_user_attributes(
             update_type="user",
             looker_user_id="-1",
         )
-        sdk = cast(Looker40SDK, uau._get_sdk())
+        sdk = get_sdk(sdk_client_id, sdk_client_secret, sdk_base_url)
         # check if user attribute is matches advanced string
 
         user_attribute_id = uau._get_user_attribute_id(sdk)
@@ -73,98 +234,293 @@ def update_user_attributes(
                 f'User attribute ({user_attribute}) is not an "String Filter (advanced)" user attribute'
             )
 
-        user_limit = 500
-        all_users = []
-        offset = 0
-
-        def fetch_users(_offset):
-            # Use provided/valid param: "limit", "offset", and correct "sorts"
-            return sdk.search_users(
-                fields="id,group_ids",
-                embed_user=False,
-                is_disabled=False,
-                limit=user_limit,
-                offset=_offset,
-                sorts="id",
+        checkpoint = checkpoint_store.load(job_id) if job_id else None
+        if checkpoint is None:
+            checkpoint = SyncCheckpoint(
+                job_id=job_id or uuid.uuid4().hex,
+                sdk_base_url=sdk_base_url,
+                user_attribute=user_attribute,
             )
+        elif (checkpoint.sdk_base_url, checkpoint.user_attribute) != (
+            sdk_base_url,
+            user_attribute,
+        ):
+            raise ValueError(f"Sync job ({job_id}) belongs to a different sync")
+        elif checkpoint.status == "completed":
+            return dict(
+                success=True,
+                job_id=checkpoint.job_id,
+                complete=True,
+                number_of_users_updated=checkpoint.number_of_users_updated,
+                number_of_users_unchanged=checkpoint.number_of_users_unchanged,
+                number_of_users_failed=0,
+                number_of_users=checkpoint.number_of_users,
+                erroring_users=None,
+            )
+        else:
+            logger.info(
+                "Resuming user attribute sync",
+                job_id=checkpoint.job_id,
+                number_of_processed_users=len(checkpoint.processed_user_ids),
+            )
+        deadline = (
+            time.monotonic() + USER_SYNC_TIME_BUDGET_SECONDS
+            if USER_SYNC_TIME_BUDGET_SECONDS
+            else None
+        )
+        complete = True
+        processed_user_ids = checkpoint.processed_user_ids
+        # user ids written since the last checkpoint save
+        unsaved_user_ids: List[str] = []
+        unsaved_memberships: List[Tuple[str, str]] = []
+        snapshot_scope = f"{sdk_base_url.rstrip('/')}|{user_attribute}"
+        snapshot = (
+            checkpoint_store.load_snapshot(snapshot_scope)
+            if incremental or diff_only
+            else MembershipSnapshot()
+        )
+        # values as of the snapshot, i.e. what the last complete run wrote
+        written_values = GroupSignatureValues(snapshot.group_names)
+        changed_signatures: Dict[str, bool] = {}
+        number_of_users_skipped = 0
 
-        done = False
-        while not done:
-            offsets = [offset + i * user_limit for i in range(5)]
-            results = []
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                futures = {executor.submit(fetch_users, o): o for o in offsets}
-                for future in as_completed(futures):
-                    batch = future.result()
-                    results.append(batch)
-            flattened = [user for batch in results for user in batch]
-            all_users.extend(flattened)
-            # If any batch had less than user_limit, we're done
-            if any(len(batch) < user_limit for batch in results):
-                done = True
-            else:
-                offset += 5 * user_limit
-        all_group_id = set()
-        for user in all_users:
-            if user.group_ids:
-                all_group_id.update(set(user.group_ids))
-        # remove all users group
-        all_group_id.discard("1")
-        search_groups = sdk.search_groups(id=",".join(list(all_group_id)))
-        keyed_group = {group.id: group for group in search_groups}
-        number_of_users_updated = 0
+        number_of_users = 0
+        number_of_users_updated = checkpoint.number_of_users_updated
+        number_of_users_unchanged = checkpoint.number_of_users_unchanged
         erroring_users = []
+        # group id -> name, filled in as pages reveal new groups
+        keyed_group: Dict[str, str | None] = checkpoint.group_names
+        signature_values = GroupSignatureValues(keyed_group)
+        number_of_retries = 0
+        limiter = AdaptiveConcurrency(
+            name="update_user_attributes",
+            initial=USER_UPDATE_INITIAL_WORKERS,
+            minimum=USER_UPDATE_MIN_WORKERS,
+            maximum=USER_UPDATE_MAX_WORKERS,
+            target_latency=USER_UPDATE_TARGET_LATENCY_SECONDS,
+        )
 
-        def update_user(user):
-            group_ua_value = [
-                keyed_group[group_id].name
-                for group_id in user.group_ids or []
-                if group_id in keyed_group
-            ]
+        def resolve_groups(page: Sequence[User]) -> None:
+            new_group_ids = {
+                group_id for user in page for group_id in user.group_ids or []
+            }
+            # remove all users group
+            new_group_ids.discard("1")
+            new_group_ids.difference_update(keyed_group)
+            if not new_group_ids:
+                return
+            resolved = resolve_group_names(sdk, sdk_base_url, new_group_ids)
+            keyed_group.update(resolved)
+            checkpoint_store.save_groups(checkpoint.job_id, resolved)
+
+        def save_checkpoint() -> None:
+            checkpoint.number_of_users = number_of_users
+            checkpoint.number_of_users_updated = number_of_users_updated
+            checkpoint.number_of_users_unchanged = number_of_users_unchanged
+            checkpoint_store.save_memberships(
+                snapshot_scope, checkpoint.job_id, unsaved_memberships
+            )
+            checkpoint_store.save(checkpoint, processed_user_ids=unsaved_user_ids)
+            unsaved_user_ids.clear()
+            unsaved_memberships.clear()
+
+        def verify_user(user_id: str, v: str):
+            try:
+                current = get_user_value(
+                    user_attribute_id=cast(str, user_attribute_id),
+                    looker_user_id=user_id,
+                    sdk=sdk,
+                )
+            except Exception as e:
+                logger.warning(
+                    "Error reading user attribute value", error=e, user_id=user_id
+                )
+                status = looker_error_status(e)
+                return dict(
+                    success=False,
+                    user_id=user_id,
+                    error=str(e),
+                    group_ua_value=v,
+                    retryable=status is None or status in RETRYABLE_STATUS_CODES,
+                )
+            if current == v:
+                return dict(success=True, unchanged=True)
+            return dict(
+                success=False,
+                user_id=user_id,
+                error=f"User holds a different value ({current!r})",
+                group_ua_value=v,
+            )
+
+        def write_user(user_id: str, v: str):
             try:
-                v = ",".join(filter(lambda x: x is not None, group_ua_value))
+                if verify:
+                    return verify_user(user_id, v)
                 result = update_user_by_id(
                     user_attribute_id=cast(str, user_attribute_id),
-                    looker_user_id=cast(str, user.id),
+                    looker_user_id=user_id,
                     value=v,
                     sdk=sdk,
                 )
+                result["user_id"] = user_id
+                result["group_ua_value"] = v
                 return result
             except Exception as e:
                 logger.error(
                     "Error updating user",
                     error=e,
-                    user_id=user.id,
+                    user_id=user_id,
                     user_attribute_id=user_attribute_id,
-                    group_ua_value=group_ua_value,
+                    group_ua_value=v,
                 )
-                return dict(user_id=user.id, error=str(e), group_ua_value=v)
+                return dict(user_id=user_id, error=str(e), group_ua_value=v)
 
-        with ThreadPoolExecutor(max_workers=25) as executor:
-            futures = {executor.submit(update_user, user): user for user in all_users}
-            for future in as_completed(futures):
-                result = future.result()
-                if result and result.get("success"):
-                    number_of_users_updated += 1
+        def update_user(user_id: str, v: str):
+            for attempt in range(1, USER_UPDATE_MAX_ATTEMPTS + 1):
+                limiter.acquire()
+                started_at = time.monotonic()
+                result = write_user(user_id, v)
+                retryable = bool(result.get("retryable"))
+                limiter.release(
+                    latency=time.monotonic() - started_at, throttled=retryable
+                )
+                if not retryable or attempt == USER_UPDATE_MAX_ATTEMPTS:
+                    result["attempts"] = attempt
+                    return result
+                time.sleep(
+                    random.uniform(0, USER_UPDATE_BACKOFF_BASE_SECONDS * 2**attempt)
+                )
+
+        def membership_changed(signature: str) -> bool:
+            changed = changed_signatures.get(signature)
+            if changed is None:
+                # a group rename changes the value even when memberships did not
+                changed = changed_signatures[signature] = any(
+                    keyed_group.get(group_id) != snapshot.group_names.get(group_id)
+                    for group_id in signature.split(",")
+                )
+            return changed
+
+        def record(result: dict, user_id: str, signature: str) -> None:
+            nonlocal number_of_users_updated, number_of_users_unchanged
+            nonlocal number_of_retries
+            number_of_retries += result.get("attempts", 1) - 1
+            if result and result.get("success"):
+                if result.get("unchanged"):
+                    number_of_users_unchanged += 1
                 else:
-                    logger.error(
-                        "Error updating user",
-                        error=result.get("error"),
+                    number_of_users_updated += 1
+                unsaved_user_ids.append(user_id)
+                unsaved_memberships.append((user_id, signature))
+                if len(unsaved_user_ids) >= USER_SYNC_CHECKPOINT_EVERY:
+                    save_checkpoint()
+            else:
+                logger.error(
+                    "Error updating user",
+                    error=result.get("error"),
+                    user_id=result.get("user_id"),
+                    user_attribute_id=user_attribute_id,
+                    group_ua_value=result.get("group_ua_value"),
+                )
+                erroring_users.append(
+                    dict(
                         user_id=result.get("user_id"),
-                        user_attribute_id=user_attribute_id,
+                        error=result.get("error"),
                         group_ua_value=result.get("group_ua_value"),
                     )
-                    erroring_users.append(
-                        dict(
-                            user_id=result.get("user_id"),
-                            error=result.get("error"),
-                            group_ua_value=result.get("group_ua_value"),
+                )
+
+        # updates start as soon as the first page arrives; the bounded backlog of
+        # pending updates holds the next page fetch back, so memory stays flat.
+        # The pool is sized for the ceiling, the limiter decides how many run.
+        max_pending = USER_UPDATE_MAX_WORKERS * 4
+        # future -> (user id, signature)
+        pending: Dict[Future, Tuple[str, str]] = {}
+        with ThreadPoolExecutor(max_workers=USER_UPDATE_MAX_WORKERS) as executor:
+            # users are paged by offset, which shifts when users before it are
+            # disabled between calls, so a resumed sync starts from the top
+            for _, page in iter_user_pages(
+                sdk, page_size=USER_PAGE_SIZE, max_prefetch=USER_PAGE_PREFETCH
+            ):
+                number_of_users += len(page)
+                page = [user for user in page if user.id not in processed_user_ids]
+                if not page:
+                    continue
+                resolve_groups(page)
+                for user in page:
+                    user_id = cast(str, user.id)
+                    signature = ",".join(GroupSignatureValues.signature(user.group_ids))
+                    if snapshot.memberships.get(
+                        user_id
+                    ) == signature and not membership_changed(signature):
+                        number_of_users_skipped += 1
+                        record(
+                            dict(success=True, unchanged=True),
+                            user_id,
+                            signature,
                         )
-                    )
+                        continue
+                    value = signature_values.value_for(user.group_ids)
+                    written = snapshot.memberships.get(user_id)
+                    if (
+                        diff_only
+                        and written is not None
+                        and written_values.value_for(written.split(",")) == value
+                    ):
+                        number_of_users_skipped += 1
+                        record(
+                            dict(success=True, unchanged=True),
+                            user_id,
+                            signature,
+                        )
+                        continue
+                    future = executor.submit(update_user, user_id, value)
+                    pending[future] = (user_id, signature)
+                    while len(pending) >= max_pending:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            record(future.result(), *pending.pop(future))
+                if deadline is not None and time.monotonic() > deadline:
+                    complete = False
+                    break
+            for future in as_completed(pending):
+                record(future.result(), *pending[future])
+        if complete and not erroring_users:
+            checkpoint.status = "completed"
+        save_checkpoint()
+        if complete:
+            # users that failed or left have no row for this run and are dropped,
+            # so the next incremental run writes them again
+            checkpoint_store.finish_snapshot(
+                snapshot_scope, checkpoint.job_id, keyed_group
+            )
+        logger.info(
+            "Updated user attributes",
+            user_attribute=user_attribute,
+            job_id=checkpoint.job_id,
+            complete=complete,
+            diff_only=diff_only,
+            incremental=incremental,
+            verify=verify,
+            number_of_users_skipped=number_of_users_skipped,
+            number_of_signatures=len(signature_values),
+            number_of_retries=number_of_retries,
+            concurrency=limiter.limit,
+            lowest_concurrency=limiter.lowest,
+            highest_concurrency=limiter.highest,
+            number_of_users=number_of_users,
+            number_of_users_updated=number_of_users_updated,
+            number_of_users_unchanged=number_of_users_unchanged,
+            number_of_users_failed=len(erroring_users),
+        )
         return dict(
-            success=number_of_users_updated == len(all_users),
+            success=not erroring_users,
+            job_id=checkpoint.job_id,
+            complete=complete,
             number_of_users_updated=number_of_users_updated,
-            number_of_users=len(all_users),
+            number_of_users_unchanged=number_of_users_unchanged,
+            number_of_users_failed=len(erroring_users),
+            number_of_users=number_of_users,
             erroring_users=erroring_users if erroring_users else None,
         )
     except Exception as e:
@@ -1,4 +1,6 @@
+import hashlib
 import os
+from typing import Tuple
 
 from looker_sdk import init40
 from looker_sdk.rtl import serialize
@@ -6,6 +8,20 @@ from looker_sdk.rtl.api_settings import ApiSettings, SettingsConfig
 from looker_sdk.rtl.auth_session import AuthSession
 from looker_sdk.rtl.requests_transport import RequestsTransport
 from looker_sdk.sdk.api40.methods import Looker40SDK
+from structlog import get_logger
+
+from .cache import FUNCTION_TIMEOUT_SECONDS, TTLCache
+from .timing import count
+
+logger = get_logger()
+
+# Looker API tokens last an hour by default; AuthSession renews them shortly
+# before expiry, so pooled clients only expire after SDK_POOL_TTL_SECONDS unused.
+# An evicted client is closed only once any request still holding it has ended.
+SDK_POOL_MAX_SIZE = int(os.environ.get("SDK_POOL_MAX_SIZE", "32"))
+SDK_POOL_TTL_SECONDS = float(os.environ.get("SDK_POOL_TTL_SECONDS", "3600"))
+
+TSdkPoolKey = Tuple[str, str, str]
 
 
 class BlendApiSettings(ApiSettings):
@@ -23,6 +39,31 @@ class BlendApiSettings(ApiSettings):
         super().__init__()
 
 
+def _close_sdk(key: TSdkPoolKey, sdk: Looker40SDK) -> None:
+    session = getattr(sdk.transport, "session", None)
+    if session is not None:
+        session.close()
+
+
+sdk_pool: TTLCache[TSdkPoolKey, Looker40SDK] = TTLCache(
+    name="looker_sdk",
+    max_size=SDK_POOL_MAX_SIZE,
+    ttl=SDK_POOL_TTL_SECONDS,
+    on_evict=_close_sdk,
+    sliding=True,
+    evict_delay=FUNCTION_TIMEOUT_SECONDS,
+)
+
+
+def sdk_pool_key(
+    sdk_client_id: str,
+    sdk_client_secret: str,
+    sdk_base_url: str,
+) -> TSdkPoolKey:
+    secret_hash = hashlib.sha256(sdk_client_secret.encode()).hexdigest()
+    return (sdk_base_url.rstrip("/"), sdk_client_id, secret_hash)
+
+
 def get_sdk(
     sdk_client_id: str,
     sdk_client_secret: str,
@@ -31,21 +72,44 @@ def get_sdk(
     single_tenant = os.environ.get("MULTITENANT") == "false"
     if single_tenant:
         # requires LOOKER_SDK_BASE_URL, LOOKER_SDK_CLIENT_ID, LOOKER_SDK_CLIENT_SECRET environment variables to be set
-        return init40()
+        return sdk_pool.get_or_create(("env", "", ""), init40)
     else:
-        settings = BlendApiSettings(
-            base_url=sdk_base_url,
-            client_id=sdk_client_id,
-            client_secret=sdk_client_secret,
-        )
-        settings.is_configured()
-        transport = RequestsTransport.configure(settings)
-        auth = AuthSession(settings, transport, serialize.deserialize40, "4.0")  # type: ignore
-
-        return Looker40SDK(
-            auth,
-            serialize.deserialize40,  # type: ignore
-            serialize.serialize40,  # type: ignore
-            transport,
-            "4.0",
+        return sdk_pool.get_or_create(
+            sdk_pool_key(sdk_client_id, sdk_client_secret, sdk_base_url),
+            lambda: _create_sdk(sdk_client_id, sdk_client_secret, sdk_base_url),
         )
+
+
+def _create_sdk(
+    sdk_client_id: str,
+    sdk_client_secret: str,
+    sdk_base_url: str,
+) -> Looker40SDK:
+    logger.debug("Creating Looker SDK client", sdk_base_url=sdk_base_url)
+    settings = BlendApiSettings(
+        base_url=sdk_base_url,
+        client_id=sdk_client_id,
+        client_secret=sdk_client_secret,
+    )
+    settings.is_configured()
+    transport = RequestsTransport.configure(settings)
+    auth = AuthSession(settings, transport, serialize.deserialize40, "4.0")  # type: ignore
+
+    return Looker40SDK(
+        auth,
+        serialize.deserialize40,  # type: ignore
+        serialize.serialize40,  # type: ignore
+        transport,
+        "4.0",
+    )
+
+
+def ensure_authenticated(sdk: Looker40SDK) -> None:
+    """Logs the client in unless it already holds an active token.
+
+    A pooled client is keyed on its credentials, so this checks them before a
+    caller is served from a cache shared by everyone on the host.
+    """
+    if not sdk.auth.is_authenticated:
+        count("looker_sdk_calls")
+        sdk.auth.authenticate({})
@@ -1,14 +1,24 @@
+import contextvars
 import os
-from typing import cast
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, cast
 
 import functions_framework
 from structlog import get_logger
 from werkzeug import Request
 
-from .functions.get_access_grant import get_access_grant
-from .functions.github_commit_and_deploy import github_commit_and_deploy
-from .functions.update_user_attributes import update_user_attributes
-from .models import AccessGrant, RequestBody, RequestHeaders
+# the Looker SDK, PyGithub and lkr are imported by the paths that call them,
+# so cold starts and dry runs don't pay for loading them
+from .functions.jobs import job_owner, job_queue
+from .functions.timing import request_timer, timed
+from .models import (
+    AccessGrant,
+    BatchRequestBody,
+    RequestBody,
+    RequestHeaders,
+    UpdateUserAttributesBody,
+)
 
 PERSONAL_ACCESS_TOKEN = os.environ.get("PERSONAL_ACCESS_TOKEN")
 
@@ -19,16 +29,219 @@ def SuccessResponse(**kwargs):
     return dict(ok=True, **kwargs), 200
 
 
+class BlendError(Exception):
+    pass
+
+
+def request_data(request: Request) -> bytes:
+    """The raw body, validated straight into a model without a dict in between."""
+    return request.get_data() or b"{}"
+
+
+def prepare_lookml(body: RequestBody, headers: RequestHeaders) -> str:
+    """Applies server-side field options, resolves the access grant and renders the LookML."""
+    access_grant: AccessGrant | None = None
+
+    # was easier to handle a single "create_measures" and apply it to all fields server-side
+    if body.create_measures:
+        for field in body.fields:
+            if field.field_type == "measure":
+                field.create_measure = True
+
+    if body.add_access_grant:
+        if not headers.client_id:
+            raise BlendError("Missing Looker Client ID")
+        elif not headers.client_secret:
+            raise BlendError("Missing Looker Client Secret")
+        elif not headers.host_origin:
+            raise BlendError("Missing Looker Base URL")
+        elif not body.user_attribute:
+            raise BlendError("Missing User Attribute")
+        elif headers.unfilled_client_id:
+            raise BlendError(
+                f"Unfilled Looker Client ID ({headers.unfilled_client_id})"
+            )
+        elif headers.unfilled_client_secret:
+            raise BlendError(
+                f"Unfilled Looker Client Secret ({headers.unfilled_client_secret})"
+            )
+        else:
+            from .functions.get_access_grant import get_access_grant
+
+            with timed("access_grant"):
+                ag_response = get_access_grant(
+                    sdk_client_id=headers.client_id,
+                    sdk_client_secret=headers.client_secret.get_secret_value(),
+                    sdk_base_url=headers.host_origin,
+                    user_attribute=body.user_attribute,
+                    models=body.models,
+                    uuid=body.uuid,
+                )
+            if not ag_response["success"]:
+                raise BlendError(ag_response.get("error", "Unknown error"))
+            else:
+                access_grant = cast(AccessGrant, ag_response["access_grant"])
+
+    with timed("lookml"):
+        return body.get_lookml(access_grant)
+
+
+def blend_job_owner(headers: RequestHeaders) -> str | None:
+    """Jobs belong to whoever holds the GitHub token they commit with."""
+    if not headers.host_origin or not headers.personal_access_token:
+        return None
+    return job_owner(
+        headers.host_origin, headers.personal_access_token.get_secret_value()
+    )
+
+
+def save_blend(body: RequestBody, headers: RequestHeaders, lookml: str) -> dict:
+    """Commits and deploys one blend, returning the success payload."""
+    from .functions.github_commit_and_deploy import github_commit_and_deploy
+
+    response = github_commit_and_deploy(
+        lookml=lookml,
+        sdk_base_url=headers.host_origin,
+        **body.model_dump(),
+        personal_access_token=headers.personal_access_token.get_secret_value(),
+        webhook_secret=headers.webhook_secret.get_secret_value(),
+    )
+    if not response.file.success:
+        raise BlendError(f"Failed to create file {response.file.filename} in {response.file.repo}: check personal access token user attribute")
+    if not response.deploy.success:
+        raise BlendError(f"Failed to deploy Looker project {response.deploy.project_name}: check deploy webhook secret user attribute")
+    return dict(
+        explore_url=body.explore_url,
+        explore_id=body.explore_id,
+        lookml_model_name=body.lookml_model,
+        explore_name=body.name,
+        lookml=lookml,
+        unchanged=response.file.unchanged,
+    )
+
+
+def save_blends(batch: BatchRequestBody, headers: RequestHeaders) -> List[dict]:
+    """Saves a batch of blends with one commit per repo and one deploy per project."""
+    from .functions.github_commit_and_deploy import (
+        BatchBlend,
+        blend_filename,
+        github_batch_commit_and_deploy,
+    )
+
+    results: List[dict] = []
+    groups: Dict[Tuple[str, str], List[Tuple[int, BatchBlend]]] = defaultdict(list)
+    for i, body in enumerate(batch.blends):
+        result = dict(
+            ok=False,
+            uuid=body.uuid,
+            explore_url=body.explore_url,
+            explore_id=body.explore_id,
+            lookml_model_name=body.lookml_model,
+            explore_name=body.name,
+        )
+        results.append(result)
+        try:
+            lookml = prepare_lookml(body, headers)
+        except Exception as e:
+            result["error"] = str(e)
+            continue
+        result["lookml"] = lookml
+        if body.dry_run:
+            result.update(ok=True, dry_run=True)
+            continue
+        groups[(body.repo_name, body.project_name)].append(
+            (
+                i,
+                BatchBlend(
+                    uuid=body.uuid,
+                    lookml_model=body.lookml_model,
+                    connection_name=body.connection_name,
+                    lookml=lookml,
+                ),
+            )
+        )
+
+    def save_group(
+        repo_name: str, project_name: str, blends: List[BatchBlend]
+    ) -> Tuple[str | None, List[str]]:
+        """Returns an error, if any, and the filenames left unchanged."""
+        try:
+            response = github_batch_commit_and_deploy(
+                blends=blends,
+                repo_name=repo_name,
+                project_name=project_name,
+                sdk_base_url=cast(str, headers.host_origin),
+                personal_access_token=headers.personal_access_token.get_secret_value(),
+                webhook_secret=headers.webhook_secret.get_secret_value(),
+            )
+        except Exception as e:
+            logger.exception("Error committing and deploying batch", repo_name=repo_name)
+            return str(e), []
+        if not response.deploy.success:
+            return f"Failed to deploy Looker project {project_name}: check deploy webhook secret user attribute", []
+        return None, response.unchanged_filenames
+
+    if groups:
+        with ThreadPoolExecutor(max_workers=min(4, len(groups))) as executor:
+            # each group runs in a copy of this context, so its GitHub calls
+            # are timed as part of the request
+            futures = {
+                key: executor.submit(
+                    contextvars.copy_context().run,
+                    save_group,
+                    key[0],
+                    key[1],
+                    [blend for _, blend in members],
+                )
+                for key, members in groups.items()
+            }
+        for key, future in futures.items():
+            error, unchanged_filenames = future.result()
+            for i, blend in groups[key]:
+                if error:
+                    results[i]["error"] = error
+                else:
+                    results[i]["ok"] = True
+                    results[i]["unchanged"] = (
+                        blend_filename(blend.lookml_model, blend.uuid)
+                        in unchanged_filenames
+                    )
+    return results
+
+
 # Shared types between dimensions and measures
 
 
 @functions_framework.http
 def main(request: Request):
+    with request_timer() as timer:
+        response = handle_request(request)
+    body, status = response if isinstance(response, tuple) else (response, 200)
+    timer.log(
+        "Request timings", method=request.method, path=request.path, status=status
+    )
+    return body, status, {"Server-Timing": timer.server_timing()}
+
+
+def handle_request(request: Request):
+    # job status endpoint, polled by the extension after an async save
+    if request.method == "GET" and request.path.startswith("/api/jobs/"):
+        with timed("headers"):
+            headers = RequestHeaders.from_request(request)
+        owner = blend_job_owner(headers)
+        job = (
+            job_queue.get(request.path.removeprefix("/api/jobs/"), owner=owner)
+            if owner
+            else None
+        )
+        if job is None:
+            return dict(ok=False, error="Job not found"), 404
+        return dict(ok=job.status != "failed", **job.model_dump(mode="json")), 200
+
     if request.method != "POST":
         return dict(ok=False, error="Method not allowed"), 405
     headers: RequestHeaders | None = None
     body: RequestBody | None = None
-    access_grant: AccessGrant | None = None
 
     def ErrorResponse(error: str, **kwargs):
         logger.error(
@@ -40,13 +253,21 @@ def main(request: Request):
         return dict(ok=False, error=error, **kwargs), 200
 
     try:
-        headers = cast(RequestHeaders, RequestHeaders.from_request(request))
+        with timed("headers"):
+            headers = cast(RequestHeaders, RequestHeaders.from_request(request))
     except Exception as e:
         return ErrorResponse(str(e))
 
     # user attribute updater endpoint
     if request.path == "/api/update_user_attributes":
-        user_attribute = request.json.get("user_attribute") if request.json else None
+        try:
+            with timed("validation"):
+                update_body = UpdateUserAttributesBody.model_validate_json(
+                    request_data(request)
+                )
+        except Exception as e:
+            return ErrorResponse(str(e))
+        user_attribute = update_body.user_attribute
         if not headers.host_origin:
             return ErrorResponse("Missing origin of request")
         if not headers.client_id:
@@ -63,11 +284,17 @@ def main(request: Request):
             return ErrorResponse(
                 f"Please provide a Looker Client Secret in the user attribute ({headers.unfilled_client_secret})"
             )
+        from .functions.update_user_attributes import update_user_attributes
+
         return update_user_attributes(
             sdk_base_url=headers.host_origin,
             sdk_client_id=headers.client_id,
             sdk_client_secret=headers.client_secret.get_secret_value(),
             user_attribute=user_attribute,
+            diff_only=update_body.diff_only,
+            incremental=update_body.incremental,
+            verify=update_body.verify,
+            job_id=update_body.job_id,
         )
 
     if not headers.host_origin:
@@ -89,52 +316,45 @@ def main(request: Request):
             user_attribute=headers.unfilled_personal_access_token,
         )
 
+    # batch endpoint: many blends, one commit per repo and one deploy per project
+    if request.path == "/api/batch":
+        try:
+            with timed("validation"):
+                batch = BatchRequestBody.model_validate_json(request_data(request))
+        except Exception as e:
+            return ErrorResponse(str(e), referrer=request.referrer)
+        results = save_blends(batch, headers)
+        return dict(ok=all(result["ok"] for result in results), results=results), 200
+
     try:
-        body = RequestBody(**request.json if request.json else {})
+        with timed("validation"):
+            body = RequestBody.model_validate_json(request_data(request))
     except Exception as e:
         return ErrorResponse(str(e), referrer=request.referrer)
 
-    # was easier to handle a single "create_measures" and apply it to all fields server-side
-    if body.create_measures:
-        for field in body.fields:
-            if field.field_type == "measure":
-                field.create_measure = True
+    try:
+        lookml = prepare_lookml(body, headers)
+    except Exception as e:
+        return ErrorResponse(str(e))
 
-    if body.add_access_grant:
-        if not headers.client_id:
-            return ErrorResponse("Missing Looker Client ID")
-        elif not headers.client_secret:
-            return ErrorResponse("Missing Looker Client Secret")
-        elif not headers.host_origin:
-            return ErrorResponse("Missing Looker Base URL")
-        elif not body.user_attribute:
-            return ErrorResponse("Missing User Attribute")
-        elif headers.unfilled_client_id:
-            return ErrorResponse(
-                f"Unfilled Looker Client ID ({headers.unfilled_client_id})"
-            )
-        elif headers.unfilled_client_secret:
-            return ErrorResponse(
-                f"Unfilled Looker Client Secret ({headers.unfilled_client_secret})"
-            )
-        else:
-            try:
-                ag_response = get_access_grant(
-                    sdk_client_id=headers.client_id,
-                    sdk_client_secret=headers.client_secret.get_secret_value(),
-                    sdk_base_url=headers.host_origin,
-                    user_attribute=body.user_attribute,
-                    models=body.models,
-                    uuid=body.uuid,
-                )
-                if not ag_response["success"]:
-                    return ErrorResponse(ag_response.get("error", "Unknown error"))
-                else:
-                    access_grant = cast(AccessGrant, ag_response["access_grant"])
-            except Exception as e:
-                return ErrorResponse(str(e))
+    if body.run_async and not body.dry_run:
+        job_body, job_headers, job_lookml = body, headers, lookml
 
-    lookml = body.get_lookml(access_grant)
+        # the access grant and LookML are settled above, so invalid requests fail
+        # here; the worker only commits and deploys. It runs after the response,
+        # which needs CPU always allocated (see JobQueue).
+        def run(progress):
+            progress("github_commit_and_deploy")
+            return save_blend(job_body, job_headers, job_lookml)
+
+        job = job_queue.submit("save_blend", run, owner=blend_job_owner(headers))
+        return SuccessResponse(
+            job_id=job.id,
+            status=job.status,
+            status_url=f"/api/jobs/{job.id}",
+            explore_url=body.explore_url,
+            explore_id=body.explore_id,
+        )
 
     if body.dry_run:
         return dict(
@@ -147,25 +367,9 @@ def main(request: Request):
 
     else:
         try:
-            response = github_commit_and_deploy(
-                lookml=lookml,
-                sdk_base_url=headers.host_origin,
-                **body.model_dump(),
-                personal_access_token=headers.personal_access_token.get_secret_value(),
-                webhook_secret=headers.webhook_secret.get_secret_value(),
-            )
-            if not response.file.success:
-                return ErrorResponse(f"Failed to create file {response.file.filename} in {response.file.repo}: check personal access token user attribute")
-            if not response.deploy.success:
-                return ErrorResponse(f"Failed to deploy Looker project {response.deploy.project_name}: check deploy webhook secret user attribute")
+            return SuccessResponse(**save_blend(body, headers, lookml))
+        except BlendError as e:
+            return ErrorResponse(str(e))
         except Exception as e:
             logger.exception("Error committing and deploying")
             return ErrorResponse(str(e))
-
-        return SuccessResponse(
-            explore_url=body.explore_url,
-            explore_id=body.explore_id,
-            lookml_model_name=body.lookml_model,
-            explore_name=body.name,
-            lookml=lookml,
-        )
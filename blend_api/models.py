@@ -1,7 +1,19 @@
+import hashlib
 import os
 from datetime import datetime, timezone
 from enum import Enum
-from typing import List, Literal, Optional, Self, Set, Union, cast, get_args
+from types import MappingProxyType
+from typing import (
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Self,
+    Set,
+    Union,
+    cast,
+    get_args,
+)
 
 from pydantic import BaseModel, Field, SecretStr, model_validator
 from structlog import get_logger
@@ -9,6 +21,8 @@ from werkzeug import Request
 
 logger = get_logger()
 
+LOOKML_TIMESTAMP_PREFIX = "# This file is automatically generated: "
+
 TUserAttributeKeys = Literal[
     "personal_access_token", "client_secret", "webhook_secret", "client_id"
 ]
@@ -243,6 +257,76 @@ TMeasureFieldType = Union[
 ]
 
 
+# date parts that are numbers rather than strings once taken out of a date
+_NUMERIC_DATE_FIELD_TYPES = frozenset(
+    {
+        "date_month_num",
+        "date_year",
+        "date_day_of_month",
+        "date_day_of_week_index",
+        "date_day_of_year",
+        "date_fiscal_month_num",
+        "date_fiscal_year",
+        "date_hour_of_day",
+        "date_week_of_year",
+    }
+)
+_NUMERIC_MEASURE_ONLY_FIELD_TYPES = frozenset(
+    {
+        "average",
+        "average_distinct",
+        "median",
+        "median_distinct",
+        "sum",
+        "sum_distinct",
+        "max",
+        "min",
+        "count",
+        "count_distinct",
+    }
+)
+_INVALID_MEASURE_ONLY_FIELD_TYPES = frozenset(
+    get_args(TMeasureOnlyFieldType)
+) - _NUMERIC_MEASURE_ONLY_FIELD_TYPES
+
+
+def _dimension_type(field_type: str) -> TDimensionFieldType:
+    if field_type.startswith("date_"):
+        if field_type in _NUMERIC_DATE_FIELD_TYPES:
+            return "number"
+        elif field_type == "date_date":
+            return "date"
+        elif field_type == "date_time":
+            return "date_time"
+        else:
+            return "string"
+    if field_type in _NUMERIC_MEASURE_ONLY_FIELD_TYPES:
+        return "number"
+    if field_type in _INVALID_MEASURE_ONLY_FIELD_TYPES:
+        return "string"
+    return cast(TDimensionFieldType, field_type)
+
+
+# Built once at import: every accepted field type -> the type it renders with
+DIMENSION_TYPE_BY_FIELD_TYPE: Mapping[str, TDimensionFieldType] = MappingProxyType(
+    {
+        field_type: _dimension_type(field_type)
+        for field_type in (
+            *(arg for t in get_args(TDimensionFieldType) for arg in get_args(t)),
+            *get_args(TMeasureOnlyFieldType),
+        )
+    }
+)
+MEASURE_TYPE_BY_FIELD_TYPE: Mapping[str, TMeasureFieldType | None] = (
+    MappingProxyType(
+        {
+            field_type: MeasureToMeasureEnum[field_type].value
+            for field_type in get_args(TMeasureOnlyFieldType)
+        }
+    )
+)
+
+
 class AccessGrant(BaseModel):
     uuid: str
     user_attribute: str
@@ -260,7 +344,7 @@ class AccessGrant(BaseModel):
     def access_grant(self) -> str:
         return f"""access_grant: {self.name} {{
   user_attribute: {self.user_attribute}
-  allowed_values: [{", ".join(self.allowed_values)}]
+  allowed_values: [{", ".join(sorted(self.allowed_values))}]
 }}"""
 
 
@@ -303,95 +387,59 @@ class BlendField(BaseModel):
 
     @property
     def lookml(self) -> str:
-        sql: str = "${TABLE}." + self.sql_alias
-        out = ""
-        if (
-            self.create_measure
-            and self.field_type == "measure"
-            and self.forced_measure_type
-        ):
-            out += f"""  measure: {self.dimension_name} {{
-    label: "{self.label_short}"
-    view_label: "{self.view_label}"
-    group_label: "{self.group_label}"
-    description: "{self.description}"
-    type: {self.forced_measure_type}
-    sql: {sql} ;;
-  }}
-            """
-        else:
-            out += f"""  dimension: {self.dimension_name} {{
-    label: "{self.label_short}"
-    view_label: "{self.view_label}"
-    group_label: "{self.group_label}"
-    description: "{self.description}"
-    type: {self.forced_dimension_type}
-    sql: {sql} ;;
-  }}
-        """
-
-        return out
+        parts: List[str] = []
+        self.write_lookml(parts)
+        return "".join(parts)
+
+    def write_lookml(self, parts: List[str]) -> None:
+        """Appends this field's LookML to `parts` without building it as one string."""
+        measure_type = (
+            self.forced_measure_type
+            if self.create_measure and self.field_type == "measure"
+            else None
+        )
+        parts += (
+            "  measure: " if measure_type else "  dimension: ",
+            self.dimension_name,
+            ' {\n    label: "',
+            self.label_short,
+            '"\n    view_label: "',
+            self.view_label,
+            '"\n    group_label: "',
+            self.group_label,
+            '"\n    description: "',
+            self.description,
+            '"\n    type: ',
+            measure_type or self.forced_dimension_type,
+            "\n    sql: ${TABLE}.",
+            self.sql_alias,
+            # the trailing indentation is part of the committed format
+            " ;;\n  }\n            " if measure_type else " ;;\n  }\n        ",
+        )
 
     @property
     def forced_measure_type(self) -> TMeasureFieldType | None:
-        if self.type in get_args(TMeasureOnlyFieldType):
-            return MeasureToMeasureEnum[self.type].value
+        return MEASURE_TYPE_BY_FIELD_TYPE.get(self.type)
 
     @property
     def forced_dimension_type(self) -> TDimensionFieldType:
-        if self.type.startswith("date_"):
-            if self.type in [
-                "date_month_num",
-                "date_year",
-                "date_day_of_month",
-                "date_day_of_week_index",
-                "date_day_of_year",
-                "date_fiscal_month_num",
-                "date_fiscal_year",
-                "date_hour_of_day",
-                "date_week_of_year",
-            ]:
-                return "number"
-            elif self.type == "date_date":
-                return "date"
-            elif self.type == "date_time":
-                return "date_time"
-            else:
-                return "string"
-
-        if self.type in {
-            arg for t in get_args(TDimensionFieldType) for arg in get_args(t)
-        }:
-            return cast(TDimensionFieldType, self.type)
-        elif self.type in get_args(TMeasureOnlyFieldType):
-            if self.type in {
-                "average",
-                "average_distinct",
-                "median",
-                "median_distinct",
-                "sum",
-                "sum_distinct",
-                "max",
-                "min",
-                "count",
-                "count_distinct",
-            }:
-                return "number"
-            elif self.type in {
-                "percent_of_previous",
-                "percent_of_total",
-                "percentile",
-                "percentile_distinct",
-                "running_total",
-            }:
-                logger.warning("Invalid measure only field type", type=self.type)
-                return "string"
-            else:
-                logger.warning("Invalid measure only field type", type=self.type)
-                return "string"
-        else:
+        dimension_type = DIMENSION_TYPE_BY_FIELD_TYPE.get(self.type)
+        if dimension_type is None:
             logger.warning("Invalid field type", type=self.type)
             return "string"
+        if self.type in _INVALID_MEASURE_ONLY_FIELD_TYPES:
+            logger.warning("Invalid measure only field type", type=self.type)
+        return dimension_type
+
+
+def lookml_fingerprint(lookml: str) -> str:
+    """Hash of generated LookML that ignores the generation timestamp header."""
+    content = "\n".join(
+        line
+        for line in lookml.split("\n")
+        if not line.startswith(LOOKML_TIMESTAMP_PREFIX)
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
 
 
 class RequestBody(BaseModel):
@@ -413,6 +461,8 @@ class RequestBody(BaseModel):
     create_measures: bool = Field(default=False)
     add_access_grant: bool = Field(default=False)
     dry_run: bool = Field(default=False)
+    force_deploy: bool = Field(default=False)
+    run_async: bool = Field(default=False)
 
     @property
     def models(self) -> Set[str]:
@@ -430,39 +480,47 @@ class RequestBody(BaseModel):
             return f"Blend {self.uuid}"
 
     def get_lookml(self, access_grant: Optional[AccessGrant] = None) -> str:
-        out = f"# This file is automatically generated: {datetime.now(timezone.utc).isoformat()}\n"
+        parts: List[str] = []
+        self.write_lookml(parts, access_grant)
+        return "".join(parts)
+
+    def write_lookml(
+        self,
+        parts: List[str],
+        access_grant: Optional[AccessGrant] = None,
+        *,
+        generated_at: datetime | None = None,
+    ) -> None:
+        """Appends the blend's LookML to `parts` in one pass; join them once at the end."""
+        generated_at = generated_at or datetime.now(timezone.utc)
+        parts += (LOOKML_TIMESTAMP_PREFIX, generated_at.isoformat(), "\n")
         if self.user_commit_comment:
-            out += f"# {self.user_commit_comment}\n"
-        out += f"# URL: {self.url}/explore/{self.lookml_model}/{self.name}\n"
+            parts += ("# ", self.user_commit_comment, "\n")
+        parts += ("# URL: ", self.url, "/explore/", self.lookml_model, "/", self.name)
+        parts.append("\n")
         if self.includes:
-            out += f"""
-include: "{self.includes}"
-            """
-
+            parts += ('\ninclude: "', self.includes, '"\n            ')
+        if access_grant:
+            parts += (
+                "\naccess_grant: access_grant_",
+                access_grant.uuid,
+                " {\n    user_attribute: ",
+                access_grant.user_attribute,
+                "\n    allowed_values: [",
+                ", ".join(sorted(access_grant.allowed_values)),
+                "]\n}\n        ",
+            )
+        parts += ("\nview: ", self.name, " {\n  derived_table: {\n    sql: ")
+        parts += (self.sql, " ;;\n  }\n")
+        for i, field in enumerate(self.fields):
+            if i:
+                parts.append("\n")
+            field.write_lookml(parts)
+        parts += ("\n}\n        ", "\nexplore: ", self.name, " {\n  hidden: yes\n")
+        parts += ('  label: "', self.label_explore, '" ')
         if access_grant:
-            out += f"""
-access_grant: access_grant_{access_grant.uuid} {{
-    user_attribute: {access_grant.user_attribute}
-    allowed_values: [{", ".join(access_grant.allowed_values)}]
-}}
-        """
-        view = f"""
-view: {self.name} {{
-  derived_table: {{
-    sql: {self.sql} ;;
-  }}
-{"\n".join(field.lookml for field in self.fields)}
-}}
-        """
-        explore = f"""
-explore: {self.name} {{
-  hidden: yes
-  label: "{self.label_explore}" {("\n" + access_grant.explore_access_grant) if access_grant else ""}
-}}
-"""
-        out += view
-        out += explore
-        return out
+            parts += ("\n", access_grant.explore_access_grant)
+        parts.append("\n}\n")
 
     @property
     def explore_url(self) -> str:
@@ -471,3 +529,37 @@ explore: {self.name} {{
     @property
     def explore_id(self) -> str:
         return f"{self.lookml_model}::{self.name}"
+
+
+class BatchRequestBody(BaseModel):
+    blends: List[RequestBody] = Field(min_length=1)
+
+    @model_validator(mode="after")
+    def check_blends(self) -> Self:
+        seen: Set[tuple[str, str, str]] = set()
+        connections: dict[tuple[str, str], str] = {}
+        for i, blend in enumerate(self.blends):
+            key = (blend.repo_name, blend.lookml_model, blend.uuid)
+            if key in seen:
+                raise ValueError(
+                    f"Duplicate blend {blend.uuid} for model {blend.lookml_model} (blends[{i}])"
+                )
+            seen.add(key)
+            # one model file per repo/model, so its blends must agree on the connection
+            connection = connections.setdefault(
+                (blend.repo_name, blend.lookml_model), blend.connection_name
+            )
+            if connection != blend.connection_name:
+                raise ValueError(
+                    f"Blends for model {blend.lookml_model} use different connections: "
+                    f"{connection}, {blend.connection_name} (blends[{i}])"
+                )
+        return self
+
+
+class UpdateUserAttributesBody(BaseModel):
+    user_attribute: str | None = None
+    diff_only: bool = False
+    incremental: bool = False
+    verify: bool = False
+    job_id: str | None = None
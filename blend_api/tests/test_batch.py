@@ -0,0 +1,79 @@
+import pytest
+from pydantic import SecretStr, ValidationError
+
+from blend_api import main as main_module
+from blend_api.functions import github_commit_and_deploy
+from blend_api.functions.github_commit_and_deploy import (
+    ResponseBatch,
+    ResponseDeploy,
+)
+from blend_api.models import BatchRequestBody, RequestHeaders
+
+
+def _blend(uuid, repo_name="org/looker", lookml_model="blends", **kwargs):
+    return dict(
+        uuid=uuid,
+        url="https://example.looker.com",
+        fields=[],
+        sql="select 1",
+        explore_ids={"model::explore"},
+        project_name=repo_name.split("/")[-1],
+        repo_name=repo_name,
+        connection_name=kwargs.pop("connection_name", "conn"),
+        lookml_model=lookml_model,
+        **kwargs,
+    )
+
+
+def test_batch_rejects_duplicate_blends():
+    with pytest.raises(ValidationError, match="Duplicate blend"):
+        BatchRequestBody(blends=[_blend("a"), _blend("a")])
+
+
+def test_batch_rejects_conflicting_connections():
+    with pytest.raises(ValidationError, match="different connections"):
+        BatchRequestBody(
+            blends=[_blend("a"), _blend("b", connection_name="other_conn")]
+        )
+
+
+def test_save_blends_commits_once_per_repo(monkeypatch):
+    calls = []
+
+    def fake_batch_commit(*, blends, repo_name, project_name, **kwargs):
+        calls.append((repo_name, [blend.uuid for blend in blends]))
+        return ResponseBatch(
+            success=True,
+            repo=repo_name,
+            filenames=[],
+            unchanged_filenames=["blends/blends/a.explore.lkml"],
+            deploy=ResponseDeploy(
+                success=project_name != "broken", project_name=project_name
+            ),
+        )
+
+    monkeypatch.setattr(
+        github_commit_and_deploy, "github_batch_commit_and_deploy", fake_batch_commit
+    )
+    headers = RequestHeaders(
+        HTTP_X_BASE_URL="https://example.looker.com",
+        HTTP_X_WEBHOOK_SECRET=SecretStr("secret"),
+        HTTP_X_PERSONAL_ACCESS_TOKEN=SecretStr("token"),
+    )
+    batch = BatchRequestBody(
+        blends=[
+            _blend("a"),
+            _blend("b"),
+            _blend("c", repo_name="org/broken"),
+            _blend("d", dry_run=True),
+            _blend("e", add_access_grant=True),
+        ]
+    )
+    results = main_module.save_blends(batch, headers)
+
+    assert sorted(calls) == [("org/broken", ["c"]), ("org/looker", ["a", "b"])]
+    assert [result["ok"] for result in results] == [True, True, False, True, False]
+    assert [result.get("unchanged") for result in results[:2]] == [True, False]
+    assert "Failed to deploy Looker project broken" in results[2]["error"]
+    assert results[3]["dry_run"]
+    assert results[4]["error"] == "Missing Looker Client ID"
@@ -1,4 +1,14 @@
-from blend_api.models import BlendField
+from typing import get_args
+
+import pytest
+
+from blend_api.models import (
+    DIMENSION_TYPE_BY_FIELD_TYPE,
+    MEASURE_TYPE_BY_FIELD_TYPE,
+    BlendField,
+    TDimensionFieldType,
+    TMeasureOnlyFieldType,
+)
 
 def test_date_type_mapping():
     """
@@ -54,3 +64,14 @@ def test_date_type_mapping():
             f"Failed for {original_type} (name: {field_name}). "
             f"Expected {expected_type}, got {field.forced_dimension_type}"
         )
+
+
+def test_type_tables_cover_every_field_type():
+    field_types = {
+        arg for t in get_args(TDimensionFieldType) for arg in get_args(t)
+    } | set(get_args(TMeasureOnlyFieldType))
+    assert DIMENSION_TYPE_BY_FIELD_TYPE.keys() == field_types
+    assert MEASURE_TYPE_BY_FIELD_TYPE["count"] == "sum"
+    assert MEASURE_TYPE_BY_FIELD_TYPE["median"] is None
+    with pytest.raises(TypeError):
+        DIMENSION_TYPE_BY_FIELD_TYPE["date_week"] = "number"
@@ -0,0 +1,199 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from blend_api.functions import deploy as deploy_module
+from blend_api.functions.deploy import DeployScheduler
+
+
+def _response(status_code, text="", headers=None):
+    return SimpleNamespace(status_code=status_code, text=text, headers=headers or {})
+
+
+def test_deploys_are_coalesced_per_project(monkeypatch):
+    posts = []
+    monkeypatch.setattr(
+        deploy_module.requests.Session,
+        "post",
+        lambda self, url, **kwargs: posts.append(url) or _response(200),
+    )
+    scheduler = DeployScheduler(debounce=0.1, max_wait=1)
+    results = []
+
+    def deploy(project_name):
+        results.append(
+            scheduler.deploy(
+                sdk_base_url="https://example.looker.com",
+                project_name=project_name,
+                webhook_secret="secret",
+            )
+        )
+
+    threads = [
+        threading.Thread(target=deploy, args=(project,))
+        for project in ["a", "a", "a", "b"]
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(posts) == [
+        "https://example.looker.com/webhooks/projects/a/deploy",
+        "https://example.looker.com/webhooks/projects/b/deploy",
+    ]
+    assert all(result.success for result in results)
+    assert sorted(result.coalesced for result in results) == [1, 3, 3, 3]
+
+
+def test_failed_deploy_reports_error(monkeypatch):
+    monkeypatch.setattr(
+        deploy_module.requests.Session,
+        "post",
+        lambda self, url, **kwargs: _response(403, "bad secret"),
+    )
+    scheduler = DeployScheduler(debounce=0, max_wait=0)
+    result = scheduler.deploy(
+        sdk_base_url="https://example.looker.com",
+        project_name="a",
+        webhook_secret="secret",
+    )
+    assert not result.success
+    assert result.error == "bad secret"
+    assert result.attempts == 1
+
+
+def test_transient_failures_are_retried(monkeypatch):
+    monkeypatch.setattr(deploy_module, "DEPLOY_BACKOFF_BASE_SECONDS", 0)
+    responses = iter([_response(503), _response(429, headers={"Retry-After": "0"})])
+    monkeypatch.setattr(
+        deploy_module.requests.Session,
+        "post",
+        lambda self, url, **kwargs: next(responses, _response(200)),
+    )
+    result = deploy_module.call_deploy_webhook(
+        sdk_base_url="https://retry.looker.com",
+        project_name="a",
+        webhook_secret="secret",
+    )
+    assert result.success
+    assert result.attempts == 3
+
+
+def test_retries_stop_when_budget_is_spent(monkeypatch):
+    monkeypatch.setattr(deploy_module, "DEPLOY_BACKOFF_BASE_SECONDS", 0)
+    monkeypatch.setattr(
+        deploy_module.requests.Session,
+        "post",
+        lambda self, url, **kwargs: _response(502),
+    )
+    client = deploy_module.host_clients.get_or_create(
+        "https://budget.looker.com", deploy_module._HostClient
+    )
+    client.retry_budget.tokens = 1
+    result = deploy_module.call_deploy_webhook(
+        sdk_base_url="https://budget.looker.com",
+        project_name="a",
+        webhook_secret="secret",
+    )
+    assert not result.success
+    # one retry from the budget plus the ratio deposited by this deploy
+    assert result.attempts == 2
+
+
+def test_read_timeouts_are_not_retried(monkeypatch):
+    monkeypatch.setattr(deploy_module, "DEPLOY_BACKOFF_BASE_SECONDS", 0)
+    attempts = []
+
+    def post(self, url, **kwargs):
+        attempts.append(kwargs["timeout"])
+        if len(attempts) == 1:
+            raise requests.ConnectTimeout("connect timed out")
+        raise requests.ReadTimeout("read timed out")
+
+    monkeypatch.setattr(deploy_module.requests.Session, "post", post)
+    result = deploy_module.call_deploy_webhook(
+        sdk_base_url="https://timeout.looker.com",
+        project_name="a",
+        webhook_secret="secret",
+    )
+    assert not result.success
+    # the deploy may be running after a read timeout, so it is not sent again
+    assert result.attempts == 2
+    assert result.error == "read timed out"
+
+
+@pytest.mark.parametrize("status_code", [500, 504])
+def test_ambiguous_statuses_are_not_retried(monkeypatch, status_code):
+    monkeypatch.setattr(deploy_module, "DEPLOY_BACKOFF_BASE_SECONDS", 0)
+    monkeypatch.setattr(
+        deploy_module.requests.Session,
+        "post",
+        lambda self, url, **kwargs: _response(status_code, "server error"),
+    )
+    result = deploy_module.call_deploy_webhook(
+        sdk_base_url=f"https://status{status_code}.looker.com",
+        project_name="a",
+        webhook_secret="secret",
+    )
+    assert not result.success
+    # like a read timeout, the deploy may already be running
+    assert result.attempts == 1
+
+
+def test_retries_stop_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(deploy_module, "DEPLOY_DEADLINE_SECONDS", 10)
+    monkeypatch.setattr(deploy_module, "DEPLOY_CONNECT_TIMEOUT_SECONDS", 5)
+    timeouts = []
+
+    def post(self, url, **kwargs):
+        timeouts.append(kwargs["timeout"])
+        return _response(503, headers={"Retry-After": "6"})
+
+    monkeypatch.setattr(deploy_module.requests.Session, "post", post)
+    monkeypatch.setattr(deploy_module.time, "sleep", lambda seconds: None)
+    result = deploy_module.call_deploy_webhook(
+        sdk_base_url="https://deadline.looker.com",
+        project_name="a",
+        webhook_secret="secret",
+    )
+    assert not result.success
+    # a 6s backoff plus a 5s connect would overrun the 10s deadline
+    assert result.attempts == 1
+    assert timeouts[0][1] <= 10
+
+
+def test_joined_deploys_stop_waiting_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(deploy_module, "DEPLOY_DEADLINE_SECONDS", 0)
+    released = threading.Event()
+    monkeypatch.setattr(
+        deploy_module.requests.Session,
+        "post",
+        lambda self, url, **kwargs: released.wait(5) and _response(200),
+    )
+    scheduler = DeployScheduler(debounce=0.05, max_wait=0.1)
+    results = []
+
+    def deploy():
+        results.append(
+            scheduler.deploy(
+                sdk_base_url="https://stuck.looker.com",
+                project_name="a",
+                webhook_secret="secret",
+            )
+        )
+
+    leader = threading.Thread(target=deploy)
+    leader.start()
+    while not scheduler._pending:
+        time.sleep(0.001)
+    deploy()
+    # the joined save gave up on the stuck deploy instead of blocking with it
+    assert not results[0].success
+    assert "Timed out" in results[0].error
+    released.set()
+    leader.join()
+    assert results[1].success
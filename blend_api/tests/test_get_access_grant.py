@@ -0,0 +1,190 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from blend_api.functions import get_access_grant as get_access_grant_module
+from blend_api.functions.get_access_grant import get_access_grant
+from blend_api.functions import model_index
+from blend_api.functions.model_index import (
+    get_model_group_index,
+    invalidate_model_group_index,
+    refresh_model_group_index,
+)
+
+
+class FakeSdk:
+    def __init__(self, role_models, role_groups):
+        self.role_models = role_models
+        self.role_groups_map = role_groups
+        self.calls = {"all_roles": 0, "role_groups": 0}
+        self.auth = SimpleNamespace(is_authenticated=True)
+
+    def all_roles(self, fields=None):
+        self.calls["all_roles"] += 1
+        return [
+            SimpleNamespace(id=role_id, model_set=SimpleNamespace(models=models))
+            for role_id, models in self.role_models.items()
+        ]
+
+    def role_groups(self, role_id, fields=None):
+        self.calls["role_groups"] += 1
+        return [
+            SimpleNamespace(id=g, name=f"group {g}")
+            for g in self.role_groups_map.get(role_id, [])
+        ]
+
+
+@pytest.fixture
+def fake_sdk(monkeypatch):
+    invalidate_model_group_index()
+    sdk = FakeSdk(
+        role_models={
+            "1": ["model_a"],
+            "2": ["model_a", "model_b"],
+            "3": ["model_c"],
+        },
+        role_groups={"1": ["10", "11"], "2": ["11", "12"], "3": ["13"]},
+    )
+    monkeypatch.setattr(get_access_grant_module, "get_sdk", lambda *args: sdk)
+    yield sdk
+    invalidate_model_group_index()
+
+
+def _grant(models):
+    return get_access_grant(
+        sdk_client_id="id",
+        sdk_client_secret="secret",
+        sdk_base_url="https://example.looker.com",
+        user_attribute="blend_groups",
+        models=models,
+        uuid="test_uuid",
+    )
+
+
+def test_access_grant_intersects_model_groups(fake_sdk):
+    response = _grant({"model_a", "model_b"})
+    assert response["success"]
+    assert response["access_grant"].allowed_values == {"11", "12"}
+
+
+def test_access_grant_reuses_model_group_index(fake_sdk):
+    _grant({"model_a", "model_b"})
+    _grant({"model_a"})
+    assert fake_sdk.calls == {"all_roles": 1, "role_groups": 2}
+
+
+def test_access_grant_checks_credentials_with_a_warm_index(fake_sdk, monkeypatch):
+    _grant({"model_a"})
+
+    def login(transport_options):
+        raise ValueError("Invalid client credentials")
+
+    bogus = FakeSdk(fake_sdk.role_models, fake_sdk.role_groups_map)
+    bogus.auth = SimpleNamespace(is_authenticated=False, authenticate=login)
+    monkeypatch.setattr(get_access_grant_module, "get_sdk", lambda *args: bogus)
+    with pytest.raises(ValueError, match="Invalid client credentials"):
+        _grant({"model_a"})
+    assert bogus.calls == {"all_roles": 0, "role_groups": 0}
+
+
+def test_access_grant_refreshes_stale_topology(fake_sdk, monkeypatch):
+    monkeypatch.setattr(get_access_grant_module, "MODEL_INDEX_MIN_REFRESH_SECONDS", 0)
+    _grant({"model_a"})
+    fake_sdk.role_models["4"] = ["model_a", "model_c"]
+    fake_sdk.role_groups_map["4"] = ["14"]
+
+    response = _grant({"model_a", "model_c"})
+    assert response["success"]
+    assert response["access_grant"].allowed_values == {"14"}
+    assert fake_sdk.calls["all_roles"] == 2
+
+
+def test_access_grant_forced_refreshes_are_rate_limited(fake_sdk, monkeypatch):
+    for _ in range(3):
+        assert not _grant({"model_a", "model_c"})["success"]
+    # the index was just built, so the empty intersection doesn't rebuild it
+    assert fake_sdk.calls["all_roles"] == 1
+
+    monkeypatch.setattr(get_access_grant_module, "MODEL_INDEX_MIN_REFRESH_SECONDS", 0)
+    fake_sdk.role_groups_map["3"] = ["11"]
+    response = _grant({"model_a", "model_c"})
+    # the requested models' roles are re-read even though their model sets match
+    assert response["access_grant"].allowed_values == {"11"}
+    assert fake_sdk.calls["all_roles"] == 2
+
+
+def test_access_grant_fetches_role_groups_concurrently(fake_sdk):
+    in_flight = {"current": 0, "max": 0}
+    lock = threading.Lock()
+    role_groups = fake_sdk.role_groups
+
+    def slow_role_groups(role_id, fields=None):
+        with lock:
+            in_flight["current"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["current"])
+        time.sleep(0.05)
+        with lock:
+            in_flight["current"] -= 1
+        return role_groups(role_id, fields)
+
+    fake_sdk.role_groups = slow_role_groups
+    fake_sdk.role_models.update({"4": ["model_a"], "5": ["model_a"]})
+
+    _grant({"model_a", "model_b"})
+    # role 2 is shared by both models and is only fetched once
+    assert fake_sdk.calls["role_groups"] == 4
+    assert in_flight["max"] > 1
+
+
+def test_model_group_index_refreshes_incrementally(fake_sdk):
+    index = get_model_group_index(fake_sdk, "https://example.looker.com")
+    assert index.groups_for_models(fake_sdk, {"model_a", "model_c"}) == set()
+    assert index.groups_for_model("model_c") == {"13"}
+    assert fake_sdk.calls["role_groups"] == 3
+
+    fake_sdk.role_models["3"] = ["model_c", "model_d"]
+    fake_sdk.role_groups_map["3"] = ["13", "15"]
+    # a group change on an unchanged role waits for the next full refresh
+    fake_sdk.role_groups_map["1"] = ["10"]
+    refreshed = refresh_model_group_index(fake_sdk, "https://example.looker.com")
+    assert refreshed.groups_for_models(fake_sdk, {"model_c"}) == {"13", "15"}
+    assert refreshed.groups_for_models(fake_sdk, {"model_a"}) == {"10", "11", "12"}
+    # only the role whose model set changed is fetched again
+    assert fake_sdk.calls == {"all_roles": 2, "role_groups": 4}
+    # models not reached by a changed role keep their previous entry
+    assert refreshed.model_groups["model_a"] is index.model_groups["model_a"]
+
+
+def test_model_group_index_drops_removed_groups(fake_sdk, monkeypatch):
+    url = "https://example.looker.com"
+    assert _grant({"model_b"})["access_grant"].allowed_values == {"11", "12"}
+    fake_sdk.role_groups_map["2"] = ["11"]
+    # incremental refreshes keep the groups of roles whose model set is unchanged
+    refresh_model_group_index(fake_sdk, url)
+    assert _grant({"model_b"})["access_grant"].allowed_values == {"11", "12"}
+    assert fake_sdk.calls["role_groups"] == 1
+
+    # however often the index is refreshed, its groups are re-read once they
+    # are ROLE_TOPOLOGY_TTL_SECONDS old
+    monkeypatch.setattr(model_index, "ROLE_TOPOLOGY_TTL_SECONDS", 0)
+    refresh_model_group_index(fake_sdk, url)
+    assert _grant({"model_b"})["access_grant"].allowed_values == {"11"}
+    assert fake_sdk.calls["role_groups"] == 2
+
+
+def test_model_group_index_refreshes_in_background(fake_sdk, monkeypatch):
+    index = get_model_group_index(fake_sdk, "https://example.looker.com")
+    monkeypatch.setattr(model_index, "MODEL_INDEX_REFRESH_SECONDS", 0)
+    fake_sdk.role_models["3"] = ["model_c", "model_d"]
+    fake_sdk.role_groups_map["3"] = ["16"]
+
+    stale = get_model_group_index(fake_sdk, "https://example.looker.com")
+    assert stale is index
+    for _ in range(100):
+        current = model_index.model_group_index_cache.get("https://example.looker.com")
+        if current is not index:
+            break
+        time.sleep(0.01)
+    assert current.groups_for_models(fake_sdk, {"model_c"}) == {"16"}
@@ -0,0 +1,338 @@
+import base64
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+from github import GithubException
+
+from blend_api.functions import deploy as deploy_module
+from blend_api.functions import github_commit_and_deploy as module
+from blend_api.functions.github_commit_and_deploy import github_commit_and_deploy
+
+
+class FakeRepo:
+    full_name = "org/looker"
+    default_branch = "main"
+
+    def __init__(self, files=None):
+        self.files = dict(files or {})
+        self.calls = []
+        self.head_sha = "head0"
+        self.ref_conflicts = 0
+        self.trees = {}
+        self.commits = {}
+
+    def _tree(self, files):
+        sha = hashlib.sha1(repr(sorted(files.items())).encode()).hexdigest()
+        self.trees[sha] = dict(files)
+        return SimpleNamespace(sha=sha, elements=[])
+
+    def get_contents(self, path, ref=None):
+        self.calls.append(("get_contents", path))
+        if path not in self.files and not any(
+            f.startswith(path + "/") for f in self.files
+        ):
+            raise GithubException(404, "Not Found")
+        return SimpleNamespace(
+            sha=f"sha-{path}", decoded_content=self.files.get(path, "").encode()
+        )
+
+    def create_file(self, path, message, content):
+        self.calls.append(("create_file", path))
+        self.files[path] = content
+
+    def update_file(self, path, message, content, sha):
+        self.calls.append(("update_file", path))
+        self.files[path] = content
+
+    def get_branch(self, branch):
+        self.calls.append(("get_branch", branch))
+        return SimpleNamespace(
+            commit=SimpleNamespace(
+                commit=SimpleNamespace(sha=self.head_sha, tree=self._tree(self.files))
+            )
+        )
+
+    def get_git_tree(self, sha, recursive=False):
+        self.calls.append(("get_git_tree", sha))
+        return SimpleNamespace(
+            tree=[
+                SimpleNamespace(path=path, sha=module.git_blob_sha(content), type="blob")
+                for path, content in self.trees[sha].items()
+            ]
+        )
+
+    def get_git_blob(self, sha):
+        self.calls.append(("get_git_blob", sha))
+        content = next(
+            content
+            for content in self.files.values()
+            if module.git_blob_sha(content) == sha
+        )
+        return SimpleNamespace(content=base64.b64encode(content.encode()).decode())
+
+    def create_git_tree(self, elements, base_tree):
+        self.calls.append(("create_git_tree", base_tree.sha))
+        identities = [element._identity for element in elements]
+        files = self.trees[base_tree.sha]
+        tree = self._tree(
+            {**files, **{identity["path"]: identity["content"] for identity in identities}}
+        )
+        tree.elements = identities
+        return tree
+
+    def create_git_commit(self, message, tree, parents):
+        self.calls.append(("create_git_commit", message))
+        commit = SimpleNamespace(sha=f"commit-{len(self.calls)}", tree=tree)
+        self.commits[commit.sha] = tree.sha
+        return commit
+
+    def get_git_ref(self, ref):
+        repo = self
+
+        class Ref:
+            def edit(self, sha):
+                repo.calls.append(("edit_ref", sha))
+                if repo.ref_conflicts:
+                    repo.ref_conflicts -= 1
+                    repo.head_sha = "head1"
+                    repo.files["other.txt"] = "someone else's commit"
+                    raise GithubException(422, "Update is not a fast forward")
+                repo.head_sha = sha
+                repo.files = dict(repo.trees[repo.commits[sha]])
+
+        return Ref()
+
+
+@pytest.fixture
+def save(monkeypatch):
+    module.scaffolding_cache.invalidate()
+    module.blob_fingerprints.invalidate()
+
+    def _save(repo, **kwargs):
+        monkeypatch.setattr(module, "get_github_repo", lambda token, name: repo)
+        return github_commit_and_deploy(
+            **{
+                "lookml": "view: blend_test {}",
+                "uuid": "test",
+                "repo_name": "org/looker",
+                "personal_access_token": "token",
+                "webhook_secret": None,
+                "project_name": "looker",
+                "sdk_base_url": "https://example.looker.com",
+                "lookml_model": "blends",
+                "connection_name": "conn",
+                **kwargs,
+            }
+        )
+
+    return _save
+
+
+def test_single_commit_first_save(save):
+    repo = FakeRepo()
+    response = save(repo, single_commit=True)
+    assert response.file.success
+    assert [call[0] for call in repo.calls] == [
+        "get_contents",
+        "get_contents",
+        "get_branch",
+        "create_git_tree",
+        "create_git_commit",
+        "edit_ref",
+    ]
+    assert response.file.commit_sha == repo.head_sha
+
+
+def test_single_commit_existing_model_only_writes_blend(save, monkeypatch):
+    repo = FakeRepo({"blends/blends/blends.model.lkml": "connection: conn"})
+    trees = []
+    create_git_tree = repo.create_git_tree
+    monkeypatch.setattr(
+        repo,
+        "create_git_tree",
+        lambda elements, base_tree: (
+            trees.append(create_git_tree(elements, base_tree)) or trees[-1]
+        ),
+    )
+    save(repo, single_commit=True)
+    assert [element["path"] for element in trees[0].elements] == [
+        "blends/blends/test.explore.lkml"
+    ]
+
+
+def test_single_commit_retries_when_branch_moves(save):
+    repo = FakeRepo()
+    repo.ref_conflicts = 1
+    response = save(repo, single_commit=True)
+    assert response.file.success
+    assert [call[0] for call in repo.calls].count("edit_ref") == 2
+    # the retry builds on the commit that moved the branch
+    assert "other.txt" in repo.files
+
+
+def test_contents_api_first_save(save):
+    repo = FakeRepo()
+    response = save(repo, single_commit=False)
+    assert response.file.success
+    assert [call for call in repo.calls if call[0] == "create_file"] == [
+        ("create_file", "blends/.gitkeep"),
+        ("create_file", "blends/blends/.gitkeep"),
+        ("create_file", "blends/blends/blends.model.lkml"),
+        ("create_file", "blends/blends/test.explore.lkml"),
+    ]
+
+
+def test_scaffolding_cache_skips_probes(save):
+    repo = FakeRepo()
+    save(repo, single_commit=False)
+    repo.calls.clear()
+    save(repo, single_commit=False, lookml="view: blend_changed {}")
+    assert repo.calls == [
+        ("get_contents", "blends/blends/test.explore.lkml"),
+        ("update_file", "blends/blends/test.explore.lkml"),
+    ]
+
+    repo.calls.clear()
+    save(repo, single_commit=True, lookml="view: blend_changed_again {}")
+    assert [call for call in repo.calls if call[0] == "get_contents"] == [
+        ("get_contents", "blends/blends/test.explore.lkml"),
+    ]
+
+
+def test_scaffolding_cache_rechecks_after_failed_write(save, monkeypatch):
+    repo = FakeRepo()
+    save(repo, single_commit=False)
+    # someone removed the blend and model files behind the cache's back
+    del repo.files["blends/blends/blends.model.lkml"]
+    del repo.files["blends/blends/test.explore.lkml"]
+
+    create_file = repo.create_file
+    failures = iter([True])
+
+    def flaky_create_file(path, message, content):
+        if path.endswith(".explore.lkml") and next(failures, False):
+            raise GithubException(409, "Conflict")
+        create_file(path, message, content)
+
+    monkeypatch.setattr(repo, "create_file", flaky_create_file)
+    response = save(repo, single_commit=False)
+    assert response.file.success
+    assert "blends/blends/blends.model.lkml" in repo.files
+
+
+def test_unchanged_blend_skips_commit_and_deploy(save, monkeypatch):
+    lookml = "# This file is automatically generated: 2024-01-01\nview: blend_test {}"
+    repo = FakeRepo(
+        {
+            "blends/blends/blends.model.lkml": "connection: conn",
+            "blends/blends/test.explore.lkml": lookml.replace("2024", "2023"),
+        }
+    )
+    monkeypatch.setattr(
+        deploy_module.requests.Session,
+        "post",
+        lambda *args, **kwargs: pytest.fail("deployed"),
+    )
+    for single_commit in (False, True):
+        repo.calls.clear()
+        response = save(
+            repo, single_commit=single_commit, lookml=lookml, webhook_secret="secret"
+        )
+        assert response.file.unchanged
+        assert response.deploy.skipped and response.deploy.success
+        assert all(call[0] == "get_contents" for call in repo.calls)
+
+
+def test_batch_writes_one_commit(monkeypatch):
+    module.scaffolding_cache.invalidate()
+    module.blob_fingerprints.invalidate()
+    repo = FakeRepo({"blends/existing/existing.model.lkml": "connection: conn"})
+    trees = []
+    create_git_tree = repo.create_git_tree
+    monkeypatch.setattr(
+        repo,
+        "create_git_tree",
+        lambda elements, base_tree: (
+            trees.append(create_git_tree(elements, base_tree)) or trees[-1]
+        ),
+    )
+    monkeypatch.setattr(module, "get_github_repo", lambda token, name: repo)
+    response = module.github_batch_commit_and_deploy(
+        blends=[
+            module.BatchBlend(
+                uuid=uuid, lookml_model=model, connection_name="conn", lookml="view"
+            )
+            for uuid, model in [("a", "existing"), ("b", "existing"), ("c", "new")]
+        ],
+        repo_name="org/looker",
+        personal_access_token="token",
+        webhook_secret=None,
+        project_name="looker",
+        sdk_base_url="https://example.looker.com",
+    )
+    assert response.success
+    assert [call[0] for call in repo.calls].count("edit_ref") == 1
+    assert sorted(element["path"] for element in trees[0].elements) == [
+        "blends/existing/a.explore.lkml",
+        "blends/existing/b.explore.lkml",
+        "blends/new/c.explore.lkml",
+        "blends/new/new.model.lkml",
+    ]
+
+
+def test_batch_skips_unchanged_blends(monkeypatch):
+    module.scaffolding_cache.invalidate()
+    module.blob_fingerprints.invalidate()
+    lookml = "# This file is automatically generated: 2024-01-01\nview: blend_a {}"
+    repo = FakeRepo(
+        {
+            "blends/blends/blends.model.lkml": "connection: conn",
+            "blends/blends/a.explore.lkml": lookml.replace("2024", "2023"),
+        }
+    )
+    monkeypatch.setattr(module, "get_github_repo", lambda token, name: repo)
+    deploys = []
+    monkeypatch.setattr(
+        module,
+        "deploy_scheduler",
+        SimpleNamespace(
+            deploy=lambda **kwargs: deploys.append(kwargs)
+            or deploy_module.DeployResult(success=True)
+        ),
+    )
+
+    def save_batch(blends):
+        return module.github_batch_commit_and_deploy(
+            blends=[
+                module.BatchBlend(
+                    uuid=uuid, lookml_model="blends", connection_name="conn", lookml=lookml
+                )
+                for uuid, lookml in blends
+            ],
+            repo_name="org/looker",
+            personal_access_token="token",
+            webhook_secret="secret",
+            project_name="looker",
+            sdk_base_url="https://example.looker.com",
+        )
+
+    response = save_batch([("a", lookml), ("b", "view: blend_b {}")])
+    assert len(deploys) == 1
+    assert response.unchanged_filenames == ["blends/blends/a.explore.lkml"]
+    assert repo.files["blends/blends/a.explore.lkml"] == lookml.replace("2024", "2023")
+    assert repo.files["blends/blends/b.explore.lkml"] == "view: blend_b {}"
+
+    # the same blends again: nothing to commit and nothing to deploy
+    repo.calls.clear()
+    response = save_batch([("a", lookml), ("b", "view: blend_b {}")])
+    assert response.success
+    assert response.unchanged_filenames == [
+        "blends/blends/a.explore.lkml",
+        "blends/blends/b.explore.lkml",
+    ]
+    assert response.commit_sha is None
+    assert response.deploy.skipped and response.deploy.success
+    assert len(deploys) == 1
+    # fingerprints of blobs already read or written are not fetched again
+    assert [call[0] for call in repo.calls] == ["get_branch", "get_git_tree"]
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+# main imports in ~0.6s here; with the Looker SDK and PyGithub loaded eagerly it
+# took ~1.7s. Raise this on slow CI machines rather than loosening the module check.
+IMPORT_TIME_BUDGET_SECONDS = float(os.environ.get("IMPORT_TIME_BUDGET_SECONDS", "1.0"))
+DEFERRED_MODULES = ("looker_sdk", "github", "lkr", "requests")
+
+_SCRIPT = f"""
+import sys, time
+started_at = time.perf_counter()
+import blend_api.main
+print(time.perf_counter() - started_at)
+print(",".join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))
+"""
+
+
+def _cold_import():
+    output = subprocess.run(
+        [sys.executable, "-c", _SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+    ).stdout.splitlines()
+    return float(output[0]), [m for m in output[1].split(",") if m]
+
+
+def test_main_defers_heavy_imports():
+    _, loaded = _cold_import()
+    assert loaded == []
+
+
+def test_main_import_time_within_budget():
+    # best of three, so one slow run on a busy machine doesn't fail the build
+    seconds = min(_cold_import()[0] for _ in range(3))
+    assert seconds < IMPORT_TIME_BUDGET_SECONDS, (
+        f"importing blend_api.main took {seconds:.2f}s, "
+        f"budget is {IMPORT_TIME_BUDGET_SECONDS}s"
+    )
@@ -0,0 +1,126 @@
+import threading
+import time
+
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from blend_api import main as main_module
+from blend_api.functions.jobs import JobQueue
+
+
+def _wait(queue, job_id, owner=None):
+    for _ in range(200):
+        job = queue.get(job_id, owner=owner)
+        if job and job.done:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_queue_records_progress_and_result():
+    queue = JobQueue(max_workers=1, max_size=10, ttl=60)
+    submitted = threading.Event()
+    stages = []
+
+    def run(progress):
+        submitted.wait(1)
+        progress("working")
+        stages.append(queue.get(job.id, owner="host").stage)
+        return {"value": 1}
+
+    job = queue.submit("test", run, owner="host")
+    submitted.set()
+    finished = _wait(queue, job.id, owner="host")
+    assert finished.status == "succeeded"
+    assert finished.result == {"value": 1}
+    assert stages == ["working"]
+    assert queue.get(job.id, owner="other_host") is None
+
+
+def test_job_queue_records_failure():
+    queue = JobQueue(max_workers=1, max_size=10, ttl=60)
+
+    def run(progress):
+        raise ValueError("boom")
+
+    job = queue.submit("test", run)
+    finished = _wait(queue, job.id)
+    assert finished.status == "failed"
+    assert finished.error == "boom"
+
+
+def _request(method, path, json=None, token="token"):
+    headers = {
+        "X-Base-Url": "https://example.looker.com",
+        "X-Webhook-Secret": "secret",
+        "X-Personal-Access-Token": token,
+    }
+    return Request(
+        EnvironBuilder(
+            method=method, path=path, json=json, headers=headers
+        ).get_environ()
+    )
+
+
+def test_async_save_is_polled_through_jobs_endpoint(monkeypatch):
+    monkeypatch.setattr(main_module, "prepare_lookml", lambda body, headers: "lookml")
+    monkeypatch.setattr(
+        main_module,
+        "save_blend",
+        lambda body, headers, lookml: dict(explore_url=body.explore_url),
+    )
+    body = dict(
+        uuid="test_uuid",
+        url="https://example.looker.com",
+        fields=[],
+        sql="select 1",
+        explore_ids=["model::explore"],
+        project_name="test_proj",
+        repo_name="test_repo",
+        connection_name="test_conn",
+        lookml_model="test_model",
+        run_async=True,
+    )
+    response, status, _ = main_module.main(_request("POST", "/", json=body))
+    assert status == 200 and response["ok"]
+    assert response["status_url"] == f"/api/jobs/{response['job_id']}"
+
+    for _ in range(200):
+        job, status, _ = main_module.main(_request("GET", response["status_url"]))
+        if job["status"] == "succeeded":
+            break
+        time.sleep(0.01)
+    assert job["result"] == {"explore_url": "/explore/test_model/blend_test_uuid"}
+
+    # the same host with another token can't read the job
+    _, status, _ = main_module.main(
+        _request("GET", response["status_url"], token="other")
+    )
+    assert status == 404
+    _, status, _ = main_module.main(_request("GET", "/api/jobs/unknown"))
+    assert status == 404
+
+
+def test_async_save_rejects_invalid_requests_before_queueing(monkeypatch):
+    submitted = []
+    monkeypatch.setattr(
+        main_module.job_queue, "submit", lambda *args, **kwargs: submitted.append(1)
+    )
+    body = dict(
+        uuid="test_uuid",
+        url="https://example.looker.com",
+        fields=[],
+        sql="select 1",
+        explore_ids=["model::explore"],
+        project_name="test_proj",
+        repo_name="test_repo",
+        connection_name="test_conn",
+        lookml_model="test_model",
+        add_access_grant=True,
+        run_async=True,
+    )
+    response, status, _ = main_module.main(_request("POST", "/", json=body))
+    assert not response["ok"]
+    assert response["error"] == "Missing Looker Client ID"
+    assert submitted == []
+
@@ -1,4 +1,15 @@
-from blend_api.models import AccessGrant, BlendField, RequestBody
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from blend_api import main as main_module
+from blend_api.functions import update_user_attributes
+from blend_api.models import (
+    LOOKML_TIMESTAMP_PREFIX,
+    AccessGrant,
+    BlendField,
+    RequestBody,
+    lookml_fingerprint,
+)
 
 
 def test_access_grant():
@@ -190,3 +201,212 @@ def test_blend_field_query_alias_fallback():
         # query_alias not provided, defaults to None then validator sets it
     )
     assert field_implicit.query_alias == "test_uuid_2"
+
+
+def test_lookml_fingerprint_ignores_timestamp():
+    body = RequestBody(
+        uuid="test_uuid",
+        url="test_url",
+        fields=[],
+        sql="select 1",
+        explore_ids={"model::explore"},
+        project_name="test_proj",
+        repo_name="test_repo",
+        connection_name="test_conn",
+        lookml_model="test_model",
+    )
+    first = body.get_lookml()
+    second = body.get_lookml()
+    assert lookml_fingerprint(first) == lookml_fingerprint(second)
+
+    body.sql = "select 2"
+    assert lookml_fingerprint(body.get_lookml()) != lookml_fingerprint(first)
+
+
+def _golden_body(**kwargs) -> RequestBody:
+    return RequestBody(
+        uuid="golden",
+        url="https://example.looker.com",
+        fields=[
+            BlendField(
+                query_uuid="q1",
+                name="orders.id",
+                sql_alias="orders_id",
+                label_short="ID",
+                view_label="Orders",
+                type="number",
+            ),
+            BlendField(
+                query_uuid="q2",
+                query_alias="users",
+                name="users.count",
+                sql_alias="users_count",
+                label_short="Count",
+                view_label="Users",
+                group_label="Totals",
+                description="How many",
+                type="count",
+                create_measure=True,
+                field_type="measure",
+            ),
+            BlendField(
+                query_uuid="q2",
+                name="users.created_year",
+                sql_alias="created_year",
+                label_short="Year",
+                view_label="Users",
+                type="date_year",
+            ),
+        ],
+        sql="select *\nfrom orders",
+        explore_ids={"m::e"},
+        project_name="p",
+        repo_name="r",
+        connection_name="c",
+        lookml_model="blends",
+        explore_label="Golden",
+        **kwargs,
+    )
+
+
+def test_get_lookml_exact_output():
+    """Pins the generated LookML byte for byte, below the timestamp line."""
+    access_grant = AccessGrant(
+        uuid="golden", user_attribute="blend_groups", allowed_values={"2", "10"}
+    )
+    body = _golden_body(includes="/views/*.view.lkml", user_commit_comment="first save")
+    timestamp, lookml = body.get_lookml(access_grant).split("\n", 1)
+    assert timestamp.startswith(LOOKML_TIMESTAMP_PREFIX)
+    assert lookml == (
+        "# first save\n"
+        "# URL: https://example.looker.com/explore/blends/blend_golden\n"
+        "\n"
+        'include: "/views/*.view.lkml"\n'
+        "            \n"
+        "access_grant: access_grant_golden {\n"
+        "    user_attribute: blend_groups\n"
+        "    allowed_values: [10, 2]\n"
+        "}\n"
+        "        \n"
+        "view: blend_golden {\n"
+        "  derived_table: {\n"
+        "    sql: select *\n"
+        "from orders ;;\n"
+        "  }\n"
+        "  dimension: q1.orders_id {\n"
+        '    label: "ID"\n'
+        '    view_label: "Orders"\n'
+        '    group_label: ""\n'
+        '    description: ""\n'
+        "    type: number\n"
+        "    sql: ${TABLE}.orders_id ;;\n"
+        "  }\n"
+        "        \n"
+        "  measure: users.users_count {\n"
+        '    label: "Count"\n'
+        '    view_label: "Users"\n'
+        '    group_label: "Totals"\n'
+        '    description: "How many"\n'
+        "    type: sum\n"
+        "    sql: ${TABLE}.users_count ;;\n"
+        "  }\n"
+        "            \n"
+        "  dimension: q2.users_created_year {\n"
+        '    label: "Year"\n'
+        '    view_label: "Users"\n'
+        '    group_label: ""\n'
+        '    description: ""\n'
+        "    type: number\n"
+        "    sql: ${TABLE}.created_year ;;\n"
+        "  }\n"
+        "        \n"
+        "}\n"
+        "        \n"
+        "explore: blend_golden {\n"
+        "  hidden: yes\n"
+        '  label: "Golden" \n'
+        "  required_access_grants: [access_grant_golden]\n"
+        "}\n"
+    )
+
+    timestamp, lookml = _golden_body().get_lookml().split("\n", 1)
+    assert lookml == (
+        "# URL: https://example.looker.com/explore/blends/blend_golden\n"
+        "\n"
+        "view: blend_golden {\n"
+        "  derived_table: {\n"
+        "    sql: select *\n"
+        "from orders ;;\n"
+        "  }\n"
+        "  dimension: q1.orders_id {\n"
+        '    label: "ID"\n'
+        '    view_label: "Orders"\n'
+        '    group_label: ""\n'
+        '    description: ""\n'
+        "    type: number\n"
+        "    sql: ${TABLE}.orders_id ;;\n"
+        "  }\n"
+        "        \n"
+        "  measure: users.users_count {\n"
+        '    label: "Count"\n'
+        '    view_label: "Users"\n'
+        '    group_label: "Totals"\n'
+        '    description: "How many"\n'
+        "    type: sum\n"
+        "    sql: ${TABLE}.users_count ;;\n"
+        "  }\n"
+        "            \n"
+        "  dimension: q2.users_created_year {\n"
+        '    label: "Year"\n'
+        '    view_label: "Users"\n'
+        '    group_label: ""\n'
+        '    description: ""\n'
+        "    type: number\n"
+        "    sql: ${TABLE}.created_year ;;\n"
+        "  }\n"
+        "        \n"
+        "}\n"
+        "        \n"
+        "explore: blend_golden {\n"
+        "  hidden: yes\n"
+        '  label: "Golden" \n'
+        "}\n"
+    )
+
+
+def _request(path, json, **headers):
+    return Request(
+        EnvironBuilder(
+            method="POST",
+            path=path,
+            json=json,
+            headers={
+                "X-Base-Url": "https://example.looker.com",
+                "X-Webhook-Secret": "secret",
+                "X-Personal-Access-Token": "token",
+                **headers,
+            },
+        ).get_environ()
+    )
+
+
+def test_update_user_attributes_body_is_parsed_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        update_user_attributes,
+        "update_user_attributes",
+        lambda **kwargs: calls.append(kwargs) or dict(success=True),
+    )
+    request = _request(
+        "/api/update_user_attributes",
+        dict(user_attribute="blend_groups", incremental=True, job_id="job"),
+        **{"X-Client-Id": "client", "X-Client-Secret": "secret"},
+    )
+    assert main_module.main(request)[:2] == (dict(success=True), 200)
+    assert calls[0]["user_attribute"] == "blend_groups"
+    assert calls[0]["incremental"] is True
+    assert calls[0]["diff_only"] is False
+    assert calls[0]["job_id"] == "job"
+
+    response, _, _ = main_module.main(_request("/", dict(uuid="Not Snake")))
+    assert not response["ok"] and "uuid" in response["error"]
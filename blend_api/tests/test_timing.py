@@ -0,0 +1,57 @@
+import threading
+
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from blend_api import main as main_module
+from blend_api.functions.timing import count, current_timer, request_timer, timed
+
+
+def test_request_timer_accumulates_stages():
+    with request_timer() as timer:
+        for _ in range(2):
+            with timed("github_get_contents"):
+                pass
+        count("looker_sdk_calls", 3)
+        # threads don't inherit the request's timer
+        thread = threading.Thread(target=lambda: count("looker_sdk_calls"))
+        thread.start()
+        thread.join()
+    assert current_timer() is None
+    assert timer.calls == {"github_get_contents": 2}
+    assert timer.counters == {"looker_sdk_calls": 3}
+    header = timer.server_timing()
+    assert "github_get_contents;dur=" in header and 'desc="2 calls"' in header
+    assert 'looker_sdk_calls;desc="3"' in header
+    assert header.split(", ")[-1].startswith("total;dur=")
+
+
+def test_main_sets_server_timing_header():
+    body = dict(
+        uuid="test_uuid",
+        url="https://example.looker.com",
+        fields=[],
+        sql="select 1",
+        explore_ids=["model::explore"],
+        project_name="test_proj",
+        repo_name="test_repo",
+        connection_name="test_conn",
+        lookml_model="test_model",
+        dry_run=True,
+    )
+    request = Request(
+        EnvironBuilder(
+            method="POST",
+            path="/",
+            json=body,
+            headers={
+                "X-Base-Url": "https://example.looker.com",
+                "X-Webhook-Secret": "secret",
+                "X-Personal-Access-Token": "token",
+            },
+        ).get_environ()
+    )
+    response, status, headers = main_module.main(request)
+    assert status == 200 and response["dry_run"]
+    stages = [metric.split(";")[0] for metric in headers["Server-Timing"].split(", ")]
+    assert stages == ["headers", "validation", "lookml", "total"]
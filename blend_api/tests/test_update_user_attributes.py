@@ -0,0 +1,332 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from blend_api.functions import update_user_attributes as module
+from blend_api.functions.group_names import group_names_cache, resolve_group_names
+from blend_api.functions.sync_checkpoints import (
+    SqliteSyncCheckpointStore,
+    SyncCheckpoint,
+)
+from blend_api.functions.update_user_attributes import update_user_attributes
+
+GROUPS = {"1": "All Users", "10": "finance", "20": "sales", "30": "ops"}
+
+
+class FakeSdk:
+    def __init__(self, number_of_users, *, groups=GROUPS):
+        self.users = [
+            SimpleNamespace(
+                id=str(i), group_ids=["1", ["10", "20", "30"][i % 3], "20"][: 1 + i % 3]
+            )
+            for i in range(number_of_users)
+        ]
+        self.groups = groups
+        self.offsets = []
+        self.group_searches = []
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, structure=None):
+        return [{"name": "blend_groups", "id": "9"}]
+
+    def user_attribute(self, user_attribute_id, fields=None):
+        return SimpleNamespace(type="advanced_filter_string")
+
+    def search_users(self, *, limit, offset, **kwargs):
+        with self._lock:
+            self.offsets.append(offset)
+        return self.users[offset : offset + limit]
+
+    def search_groups(self, id, fields=None, limit=None):
+        group_ids = id.split(",")
+        self.group_searches.append(sorted(group_ids))
+        return [
+            SimpleNamespace(id=group_id, name=self.groups[group_id])
+            for group_id in group_ids
+            if group_id in self.groups
+        ]
+
+    def set_user_attribute_user_value(self, *, user_id, user_attribute_id, body):
+        with self._lock:
+            self.values[user_id] = body.value
+
+
+@pytest.fixture
+def run(monkeypatch, tmp_path):
+    group_names_cache.invalidate()
+    monkeypatch.setattr(
+        module,
+        "checkpoint_store",
+        SqliteSyncCheckpointStore(str(tmp_path / "sync.sqlite3")),
+    )
+    monkeypatch.setattr(module, "USER_PAGE_SIZE", 100)
+    monkeypatch.setattr(module, "USER_PAGE_PREFETCH", 4)
+
+    def _run(sdk, **kwargs):
+        monkeypatch.setattr(module, "get_sdk", lambda *args: sdk)
+        return update_user_attributes(
+            sdk_base_url="https://example.looker.com",
+            sdk_client_id="client",
+            sdk_client_secret="secret",
+            user_attribute="blend_groups",
+            **kwargs,
+        )
+
+    return _run
+
+
+def test_update_user_attributes_streams_pages(run):
+    sdk = FakeSdk(1250)
+    result = run(sdk)
+    assert result["success"]
+    assert result["number_of_users"] == result["number_of_users_updated"] == 1250
+    assert sdk.values["0"] == ""
+    assert sdk.values["1"] == "sales"
+    assert sdk.values["2"] == "ops,sales"
+    # pages are requested once each, and the overshoot past the last page is bounded
+    assert len(sdk.offsets) == len(set(sdk.offsets))
+    assert len(sdk.offsets) <= 13 + 4
+    # groups are only looked up the first time a page reveals them
+    assert sorted(sum(sdk.group_searches, [])) == ["20", "30"]
+
+
+def test_iter_user_pages_single_request_for_small_instances():
+    sdk = FakeSdk(40)
+    pages = list(module.iter_user_pages(sdk, page_size=100, max_prefetch=5))
+    assert [(offset, len(page)) for offset, page in pages] == [(0, 40)]
+    assert sdk.offsets == [0]
+
+
+def test_update_user_attributes_diff_only_skips_unchanged(run):
+    sdk = FakeSdk(300)
+    run(sdk)
+    # group 40 has no name, so joining it leaves user 2's value as it was
+    sdk.users[2].group_ids = ["1", "30", "20", "40"]
+    sdk.users[3].group_ids = ["1", "30"]
+    writes = []
+
+    def user_attribute_user_values(**kwargs):
+        raise AssertionError("diff_only must not read current values")
+
+    def set_user_attribute_user_value(*, user_id, user_attribute_id, body):
+        writes.append((user_id, body.value))
+
+    sdk.user_attribute_user_values = user_attribute_user_values
+    sdk.set_user_attribute_user_value = set_user_attribute_user_value
+    result = run(sdk, diff_only=True)
+    assert writes == [("3", "ops")]
+    assert result["number_of_users_unchanged"] == 299
+    assert result["number_of_users_updated"] == 1
+    assert result["number_of_users_failed"] == 0
+
+
+def test_update_user_attributes_verify_reads_without_writing(run):
+    sdk = FakeSdk(30)
+    run(sdk)
+    current = dict(sdk.values)
+    current["2"] = "stale"
+
+    def user_attribute_user_values(*, user_id, fields, user_attribute_ids):
+        return [SimpleNamespace(value=current[user_id], source="user")]
+
+    def set_user_attribute_user_value(**kwargs):
+        raise AssertionError("verify must not write")
+
+    sdk.user_attribute_user_values = user_attribute_user_values
+    sdk.set_user_attribute_user_value = set_user_attribute_user_value
+    result = run(sdk, verify=True)
+    assert not result["success"]
+    assert result["number_of_users_unchanged"] == 29
+    assert result["number_of_users_updated"] == 0
+    assert [user["user_id"] for user in result["erroring_users"]] == ["2"]
+
+
+def test_group_signature_values_share_one_value_per_membership():
+    values = module.GroupSignatureValues({"20": "sales", "30": "ops", "40": None})
+    first = values.value_for(["1", "20", "30"])
+    assert first == "sales,ops"
+    assert values.value_for(("1", "20", "30")) is first
+    # names keep the order Looker lists the groups in
+    assert values.value_for(["1", "30", "20"]) == "ops,sales"
+    assert values.value_for(["20", "1", "40", "30"]) == first
+    assert values.value_for(None) == ""
+    assert len(values) == 4
+
+
+class RateLimited(Exception):
+    documentation_url = "https://cloud.google.com/looker/docs/r/err/4.0/429/patch/x"
+
+
+def test_update_user_attributes_retries_rate_limited_users(run, monkeypatch):
+    monkeypatch.setattr(module, "USER_UPDATE_BACKOFF_BASE_SECONDS", 0)
+    sdk = FakeSdk(50)
+    set_value = sdk.set_user_attribute_user_value
+    throttled = set()
+
+    def flaky_set_value(*, user_id, user_attribute_id, body):
+        if int(user_id) % 5 == 0 and user_id not in throttled:
+            throttled.add(user_id)
+            raise RateLimited("Too many requests")
+        set_value(user_id=user_id, user_attribute_id=user_attribute_id, body=body)
+
+    sdk.set_user_attribute_user_value = flaky_set_value
+    result = run(sdk)
+    assert result["success"]
+    assert result["number_of_users_updated"] == 50
+    assert len(throttled) == 10
+
+
+def test_adaptive_concurrency_aimd():
+    from blend_api.functions.concurrency import AdaptiveConcurrency
+
+    limiter = AdaptiveConcurrency(
+        name="test", initial=4, minimum=1, maximum=6, target_latency=1, cooldown=60
+    )
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(latency=0.1)
+    assert limiter.limit == 6
+    limiter.acquire()
+    limiter.release(latency=0.1, throttled=True)
+    limiter.acquire()
+    limiter.release(latency=0.1, throttled=True)
+    # the second throttle falls inside the cooldown window
+    assert limiter.limit == 3
+    assert (limiter.lowest, limiter.highest) == (3, 6)
+
+
+def test_update_user_attributes_resumes_from_checkpoint(run, monkeypatch):
+    sdk = FakeSdk(1000)
+    writes = []
+    set_value = sdk.set_user_attribute_user_value
+
+    def counting_set_value(**kwargs):
+        writes.append(kwargs["user_id"])
+        set_value(**kwargs)
+
+    sdk.set_user_attribute_user_value = counting_set_value
+    # stop taking pages as soon as the first one has been queued
+    monkeypatch.setattr(module, "USER_SYNC_TIME_BUDGET_SECONDS", 1e-9)
+    first = run(sdk)
+    assert not first["complete"]
+    assert first["number_of_users_updated"] < 1000
+
+    monkeypatch.setattr(module, "USER_SYNC_TIME_BUDGET_SECONDS", 0)
+    sdk.offsets.clear()
+    second = run(sdk, job_id=first["job_id"])
+    assert second["complete"] and second["success"]
+    assert second["number_of_users_updated"] == second["number_of_users"] == 1000
+    assert sorted(writes, key=int) == [str(i) for i in range(1000)]
+    # users already written are skipped, not paged past
+    assert min(sdk.offsets) == 0
+
+    writes.clear()
+    assert run(sdk, job_id=first["job_id"])["number_of_users_updated"] == 1000
+    assert writes == []
+
+
+def test_update_user_attributes_resume_survives_removed_users(run, monkeypatch):
+    sdk = FakeSdk(1000)
+    writes = []
+    set_value = sdk.set_user_attribute_user_value
+
+    def counting_set_value(**kwargs):
+        writes.append(kwargs["user_id"])
+        set_value(**kwargs)
+
+    sdk.set_user_attribute_user_value = counting_set_value
+    monkeypatch.setattr(module, "USER_SYNC_TIME_BUDGET_SECONDS", 1e-9)
+    first = run(sdk)
+    assert not first["complete"]
+    written = set(writes)
+    assert "0" in written and "999" not in written
+
+    # users disabled between calls shift everyone after them to lower offsets
+    sdk.users = sdk.users[50:]
+    monkeypatch.setattr(module, "USER_SYNC_TIME_BUDGET_SECONDS", 0)
+    second = run(sdk, job_id=first["job_id"])
+    assert second["complete"] and second["success"]
+    assert set(writes) == written | {str(i) for i in range(50, 1000)}
+    assert len(writes) == len(set(writes))
+
+
+def test_completed_sync_keeps_only_its_counts(tmp_path):
+    store = SqliteSyncCheckpointStore(str(tmp_path / "sync.sqlite3"), ttl=60)
+    stale = SyncCheckpoint(job_id="stale", sdk_base_url="x", user_attribute="a")
+    store.save(stale, processed_user_ids=["1"])
+    checkpoint = SyncCheckpoint(
+        job_id="job", sdk_base_url="x", user_attribute="a", number_of_users=2
+    )
+    store.save(checkpoint, processed_user_ids=["1", "2"])
+    store.save_groups("job", {"10": "finance"})
+    assert store.load("job").processed_user_ids == {"1", "2"}
+
+    checkpoint.status = "completed"
+    store.save(checkpoint)
+    completed = store.load("job")
+    assert completed.number_of_users == 2
+    assert completed.processed_user_ids == set()
+    assert completed.group_names == {}
+
+    # expired jobs are pruned by a later save, not only on the first connect
+    store.ttl = 0
+    store.prune_interval = 0
+    store.save(checkpoint)
+    assert store.load("stale") is None
+
+
+def test_update_user_attributes_rejects_job_of_other_attribute(run):
+    sdk = FakeSdk(10)
+    job_id = run(sdk)["job_id"]
+    sdk.get = lambda path, structure=None: [{"name": "other", "id": "8"}]
+    result = update_user_attributes(
+        sdk_base_url="https://example.looker.com",
+        sdk_client_id="client",
+        sdk_client_secret="secret",
+        user_attribute="other",
+        job_id=job_id,
+    )
+    assert not result["success"]
+    assert "different sync" in result["error"]
+
+
+def test_update_user_attributes_incremental_writes_only_changes(run):
+    sdk = FakeSdk(300)
+    run(sdk)
+    writes = []
+    set_value = sdk.set_user_attribute_user_value
+
+    def counting_set_value(**kwargs):
+        writes.append(kwargs["user_id"])
+        set_value(**kwargs)
+
+    sdk.set_user_attribute_user_value = counting_set_value
+    result = run(sdk, incremental=True)
+    assert writes == []
+    assert result["number_of_users_unchanged"] == 300
+
+    sdk.users[0].group_ids = ["1", "20"]
+    sdk.groups = {**GROUPS, "30": "operations"}
+    # renames are seen once the cached group names expire
+    group_names_cache.invalidate()
+    result = run(sdk, incremental=True)
+    # user 0 joined a group, every user in group 30 sees its new name
+    assert sorted(writes, key=int) == ["0", *(str(i) for i in range(2, 300, 3))]
+    assert sdk.values["2"] == "operations,sales"
+    assert result["number_of_users_updated"] == len(writes)
+
+
+def test_resolve_group_names_chunks_and_caches(monkeypatch):
+    group_names_cache.invalidate()
+    monkeypatch.setattr("blend_api.functions.group_names.GROUP_SEARCH_CHUNK_SIZE", 10)
+    groups = {str(i): f"group {i}" for i in range(100, 135)}
+    sdk = FakeSdk(0, groups=groups)
+    names = resolve_group_names(sdk, "https://example.looker.com", [*groups, "999"])
+    assert names == {**groups, "999": None}
+    assert sorted(len(search) for search in sdk.group_searches) == [6, 10, 10, 10]
+
+    sdk.group_searches.clear()
+    resolve_group_names(sdk, "https://example.looker.com/", ["100", "999"])
+    assert sdk.group_searches == []
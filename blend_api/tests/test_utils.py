@@ -0,0 +1,95 @@
+import threading
+
+from blend_api.functions.cache import TTLCache
+from blend_api.functions.utils import get_sdk, sdk_pool
+
+
+def test_get_sdk_reuses_pooled_client():
+    sdk_pool.invalidate()
+    first = get_sdk("client", "secret", "https://example.looker.com")
+    second = get_sdk("client", "secret", "https://example.looker.com/")
+    assert first is second
+    assert first.auth is second.auth
+    assert first.transport is second.transport
+
+
+def test_get_sdk_keys_on_secret():
+    sdk_pool.invalidate()
+    first = get_sdk("client", "secret", "https://example.looker.com")
+    rotated = get_sdk("client", "rotated_secret", "https://example.looker.com")
+    assert first is not rotated
+    assert len(sdk_pool) == 2
+
+
+def test_ttl_cache_lru_and_expiry():
+    evicted = []
+    cache: TTLCache[str, int] = TTLCache(
+        name="test",
+        max_size=2,
+        ttl=60,
+        on_evict=lambda key, value: evicted.append(key),
+    )
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert evicted == ["b"]
+
+    cache.ttl = 0
+    assert cache.get("a") is None
+    assert evicted == ["b", "a"]
+
+
+def test_ttl_cache_sliding_expiry_and_delayed_evict(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("blend_api.functions.cache.time.monotonic", lambda: now[0])
+    closed = threading.Event()
+    cache: TTLCache[str, int] = TTLCache(
+        name="test",
+        max_size=2,
+        ttl=60,
+        on_evict=lambda key, value: closed.set(),
+        sliding=True,
+        evict_delay=0.05,
+    )
+    cache.set("a", 1)
+    for _ in range(3):
+        now[0] += 40
+        # in use: each get pushes the expiry back
+        assert cache.get("a") == 1
+
+    now[0] += 60
+    assert cache.get("a") is None
+    # a caller that fetched the entry before it expired may still be using it
+    assert not closed.is_set()
+    assert closed.wait(1)
+
+
+def test_get_github_repo_reuses_client_and_handle(monkeypatch):
+    from blend_api.functions import github_client
+
+    github_client.github_clients.invalidate()
+    github_client.github_repos.invalidate()
+    resolved = []
+
+    class FakeGithub:
+        def __init__(self, auth, **kwargs):
+            self.auth = auth
+
+        def get_repo(self, name):
+            resolved.append(name)
+            return object()
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(github_client, "Github", FakeGithub)
+    first = github_client.get_github_repo("token", "org/looker")
+    assert github_client.get_github_repo("token", "org/looker") is first
+    assert github_client.get_github_repo("other", "org/looker") is not first
+    assert resolved == ["org/looker", "org/looker"]
+    assert len(github_client.github_clients) == 2
+
+    github_client.invalidate_github_repo("token", "org/looker")
+    assert github_client.get_github_repo("token", "org/looker") is not first